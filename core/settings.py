@@ -47,21 +47,33 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # django.contrib.auth's AuthenticationMiddleware, with cached users and impersonation
+    'projects.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'projects.middleware.ImpersonationMiddleware',
     'projects.middleware.PasswordChangeMiddleware',
 ]
 
+# Per-view timings, Server-Timing headers and /professor/metrics/ (in-process, per worker)
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False') == 'True'
+if PROFILE_REQUESTS:
+    MIDDLEWARE.insert(0, 'projects.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Same as DjangoTemplates, plus render timing for ProfilingMiddleware
+        'BACKEND': 'projects.profiling.ProfiledDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept for the life of the worker (runserver still reloads on change)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -142,11 +154,72 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # Submission files: deduplicated by SHA-256 under MEDIA_ROOT/submissions/
+    "submissions": {
+        "BACKEND": "projects.storage.ContentAddressedStorage",
+    },
 }
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Chunked, resumable submission uploads: partial files live here until assembled.
+# Kept outside MEDIA_ROOT so unfinished, unchecked uploads are never publicly served.
+CHUNKED_UPLOAD_ROOT = Path(os.environ.get('CHUNKED_UPLOAD_ROOT', BASE_DIR / 'upload_chunks'))
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+# Largest submission accepted through chunked or direct-to-storage uploads
+SUBMISSION_MAX_SIZE = int(os.environ.get('SUBMISSION_MAX_SIZE', 500 * 1024 * 1024))
+
+# Submission downloads are permission-checked by Django. Optionally hand the bytes off
+# to the front-end server: 'x-accel-redirect' (nginx internal location mapped to
+# MEDIA_ROOT at SENDFILE_URL_PREFIX) or 'x-sendfile' (Apache/lighttpd).
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND', '')
+SENDFILE_URL_PREFIX = os.environ.get('SENDFILE_URL_PREFIX', '/protected-media/')
+
+# Direct-to-object-storage uploads: the browser PUTs to a presigned URL and only a
+# small completion callback reaches Django. Empty disables it.
+#   projects.object_storage.S3DirectUpload    - S3/MinIO, configured by the AWS_* values below
+#   projects.object_storage.LocalDirectUpload - local stand-in for development and tests
+DIRECT_UPLOAD_BACKEND = os.environ.get('DIRECT_UPLOAD_BACKEND', '')
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', '')
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL', '')
+AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', '')
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', '')
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+
+if DIRECT_UPLOAD_BACKEND == 'projects.object_storage.S3DirectUpload':
+    # Submission files then live in the bucket too (django-storages reads the same AWS_* settings)
+    STORAGES['submissions'] = {"BACKEND": "storages.backends.s3.S3Storage"}
+
+# Shared cache for every worker (Redis). Without REDIS_URL each process keeps its own
+# LocMemCache, which is fine for runserver but not for several gunicorn workers.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# 'wsgi' (gunicorn gthread / runserver) or 'asgi' (uvicorn); start.sh reads the same variable,
+# and core/urls.py serves the async variants of the page views under 'asgi'
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+# The live course board (Server-Sent Events, projects.live) needs ASGI, since a WSGI worker
+# would buffer the stream and hold a thread per open page, and a shared cache to carry
+# events between workers. Force it on for a single-process ASGI server with LIVE_COURSE_UPDATES=True.
+LIVE_COURSE_UPDATES = os.environ.get(
+    'LIVE_COURSE_UPDATES', str(SERVER_MODE == 'asgi' and bool(REDIS_URL))
+) == 'True'
+
+# How final grades are put together from team score, contribution and adjustments
+# (projects.grade_engine.GradePolicy lists every option)
+GRADE_POLICY = {
+    'contribution_weight': 0.5,
+    'max_contribution_factor': 1.2,
+    'curve': '',
+}
+
 # Auth Redirects
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
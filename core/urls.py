@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from projects import views as project_views
-from django.conf import settings
-from django.conf.urls.static import static
+
+
+def page(name):
+    """The async variant of a page view under ASGI, the sync one on WSGI's threaded workers."""
+    return getattr(project_views, f'a{name}' if settings.SERVER_MODE == 'asgi' else name)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,15 +16,27 @@ urlpatterns = [
     path('accounts/password_change/', project_views.CustomPasswordChangeView.as_view(), name='password_change'),
     path('accounts/password_change/done/', auth_views.PasswordChangeDoneView.as_view(), name='password_change_done'),
     
-    path('', project_views.dashboard, name='dashboard'),
+    path('', page('dashboard'), name='dashboard'),
     path('group/create/', project_views.create_group, name='create_group'),
     path('group/edit/<int:group_id>/', project_views.edit_group, name='edit_group'),
-    path('group/confirm/<int:membership_id>/', project_views.confirm_membership, name='confirm_membership'),
+    path('group/members/<int:course_id>/', project_views.search_members, name='search_members'),
+    path('group/confirm/<int:membership_id>/', page('confirm_membership'), name='confirm_membership'),
     path('group/upload/<int:group_id>/', project_views.upload_submission, name='upload_submission'),
-    path('professor/', project_views.professor_dashboard, name='professor_dashboard'),
-    path('professor/course/<int:course_id>/', project_views.course_detail, name='course_detail'),
+    path('group/upload/<int:group_id>/chunked/', project_views.start_chunked_upload, name='start_chunked_upload'),
+    path('upload/<uuid:upload_id>/', project_views.chunked_upload_view, name='chunked_upload'),
+    path('upload/<uuid:upload_id>/complete/', project_views.complete_chunked_upload, name='complete_chunked_upload'),
+    path('group/upload/<int:group_id>/presign/', project_views.presign_submission_upload, name='presign_submission_upload'),
+    path('upload/direct/complete/', project_views.complete_direct_upload, name='complete_direct_upload'),
+    path('upload/local-bucket/', project_views.local_bucket_put, name='local_bucket_put'),
+    path('submission/<int:submission_id>/file/', project_views.download_submission, name='download_submission'),
+    path('professor/', page('professor_dashboard'), name='professor_dashboard'),
+    path('professor/course/<int:course_id>/', page('course_detail'), name='course_detail'),
+    path('professor/course/<int:course_id>/grading/', project_views.grading_sheet, name='grading_sheet'),
+    path('professor/course/<int:course_id>/events/', project_views.course_events, name='course_events'),
+    path('professor/course/<int:course_id>/submissions.zip', project_views.download_course_submissions, name='download_course_submissions'),
+    path('professor/metrics/', project_views.profiling_metrics, name='profiling_metrics'),
     path('professor/grade/<int:group_id>/', project_views.grade_group, name='grade_group'),
     path('professor/export-csv/', project_views.export_grades_csv, name='export_grades_csv'),
     path('impersonate/<int:user_id>/', project_views.impersonate_user, name='impersonate_user'),
     path('impersonate/stop/', project_views.stop_impersonating, name='stop_impersonating'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
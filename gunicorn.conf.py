@@ -0,0 +1,31 @@
+"""Gunicorn settings used by start.sh; every value can be overridden from the environment."""
+import multiprocessing
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+cpus = multiprocessing.cpu_count()
+# Sync views block on the database, so a few threads per worker keep a core busy
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * cpus + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+if os.environ.get('SERVER_MODE') != 'asgi':
+    worker_class = 'gthread'
+
+# Import Django once in the master and fork it, instead of once per worker
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 20
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot grow without bound
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+
+
+def when_ready(server):
+    started = os.environ.get('STARTUP_BEGAN')
+    if started:
+        server.log.info("Ready to serve %.2fs after start.sh began", time.time() - float(started))
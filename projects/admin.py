@@ -3,15 +3,23 @@ from django.contrib.auth.admin import UserAdmin
 from django.urls import path
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-import csv
+from django.db.models import Prefetch
 import io
+from .auth_cache import user_cache
 from .models import User, Course, Group, Submission, Contribution, Score
 from .forms import CSVImportForm
+from .paginators import EstimatedCountPaginator
+from .passwords import set_default_passwords
+from .roster_import import import_roster
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     list_display = ('student_id', 'first_name', 'username', 'role', 'display_groups', 'has_changed_password')
     list_filter = ('role', 'has_changed_password')
+    search_fields = ('student_id', 'username', 'first_name', 'last_name', 'email')
+    paginator = EstimatedCountPaginator
+    # Filtered pages would otherwise COUNT(*) the whole table again for "N total"
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Personal info', {'fields': ('first_name', 'last_name', 'email')}),
@@ -22,6 +30,12 @@ class CustomUserAdmin(UserAdmin):
     # We explicitly omit 'groups' and 'user_permissions' from fieldsets to avoid confusion 
     # since this project uses a custom Group model.
     
+    def get_queryset(self, request):
+        # One query for every listed user's groups instead of one per row
+        return super().get_queryset(request).prefetch_related(
+            Prefetch('joined_groups', queryset=Group.objects.only('id', 'name').order_by('id'))
+        )
+
     def display_groups(self, obj):
         return ", ".join([g.name for g in obj.joined_groups.all()])
     display_groups.short_description = '所屬小組'
@@ -30,12 +44,12 @@ class CustomUserAdmin(UserAdmin):
 
     @admin.action(description="Reset password to student ID's last 4 digits")
     def reset_password(self, request, queryset):
-        for user in queryset:
-            if user.student_id:
-                new_password = user.student_id[-4:]
-                user.set_password(new_password)
-                user.has_changed_password = False
-                user.save()
+        users = set_default_passwords(queryset.exclude(student_id__isnull=True).exclude(student_id=''))
+        for user in users:
+            user.has_changed_password = False
+        User.objects.bulk_update(users, ['password', 'has_changed_password'], batch_size=500)
+        # No post_save either: drop the cached users, so old sessions end and the forced change applies
+        user_cache.invalidate_users([user.pk for user in users])
         self.message_user(request, "Passwords reset successfully.")
 
     def get_urls(self):
@@ -44,8 +58,10 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'year', 'semester')
-    filter_horizontal = ('students',)
+    list_display = ('name', 'year', 'semester', 'student_count', 'group_count')
+    search_fields = ('name',)
+    # Only the enrolled students are rendered, not every user as <option>s
+    autocomplete_fields = ('students',)
 
     def get_urls(self):
         urls = super().get_urls()
@@ -58,61 +74,59 @@ class CourseAdmin(admin.ModelAdmin):
         course = get_object_or_404(Course, id=course_id)
         if request.method == "POST":
             csv_file = request.FILES["csv_file"]
-            decoded_file = csv_file.read().decode('utf-8')
-            io_string = io.StringIO(decoded_file)
-            rows = list(csv.reader(io_string))
-            if not rows:
+            csv_file.seek(0)
+            # Decode on the fly instead of reading the whole upload into memory
+            lines = io.TextIOWrapper(csv_file.file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_roster(course, lines)
+            finally:
+                lines.detach()
+            if not result.imported and not result.skipped:
                 self.message_user(request, "The CSV file is empty.", level=messages.WARNING)
                 return redirect("..")
             
-            # Determine if first row is a header
-            first_row = [str(c).strip().lower() for c in rows[0]]
-            has_header = 'student_id' in first_row or '学号' in first_row or '學號' in first_row
-            
-            if has_header:
-                # Find indices by header names
-                try:
-                    id_idx = first_row.index('student_id') if 'student_id' in first_row else (first_row.index('學號') if '學號' in first_row else first_row.index('学号'))
-                    name_idx = first_row.index('name') if 'name' in first_row else (first_row.index('姓名') if '姓名' in first_row else 1)
-                except ValueError:
-                    id_idx, name_idx = 0, 1
-                data_start = 1
-            else:
-                # No header, assume column 0 is ID, column 1 is Name
-                id_idx, name_idx = 0, 1
-                data_start = 0
-
-            count = 0
-            for row in rows[data_start:]:
-                if len(row) > max(id_idx, name_idx):
-                    student_id = row[id_idx].strip()
-                    name = row[name_idx].strip()
-                    if student_id and name:
-                        username = student_id
-                        password = student_id[-4:]
-                        user, created = User.objects.update_or_create(
-                            username=username,
-                            defaults={
-                                'student_id': student_id,
-                                'first_name': name,
-                                'role': 'student',
-                            }
-                        )
-                        if created or not user.has_changed_password:
-                            user.set_password(password)
-                            user.save()
-                        
-                        course.students.add(user)
-                        count += 1
-            self.message_user(request, f"Successfully imported {count} students to {course.name}.")
+            self.message_user(
+                request,
+                f"Successfully imported {result.imported} students to {course.name} "
+                f"({result.created} created, {result.updated} updated, {result.skipped} skipped)."
+            )
             return redirect("..")
         
         form = CSVImportForm()
         payload = {"form": form, "course": course}
         return render(request, "admin/csv_form.html", payload)
 
-# admin.site.register(Course) is handled by @admin.register
-admin.site.register(Group)
-admin.site.register(Submission)
-admin.site.register(Contribution)
-admin.site.register(Score)
+class BigTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that grow with the number of students."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(Group)
+class GroupAdmin(BigTableAdmin):
+    list_display = ('name', 'course', 'leader', 'project_name')
+    list_select_related = ('course', 'leader')
+    list_filter = ('course',)
+    search_fields = ('name', 'project_name', 'leader__student_id')
+    autocomplete_fields = ('course', 'leader')
+
+@admin.register(Submission)
+class SubmissionAdmin(BigTableAdmin):
+    list_display = ('group', 'type', 'version', 'filename', 'uploaded_at')
+    list_select_related = ('group',)
+    list_filter = ('type',)
+    search_fields = ('group__name', 'original_filename')
+    autocomplete_fields = ('group',)
+
+@admin.register(Contribution)
+class ContributionAdmin(BigTableAdmin):
+    list_display = ('group', 'student', 'percentage')
+    list_select_related = ('group', 'student')
+    search_fields = ('group__name', 'student__student_id')
+    autocomplete_fields = ('group', 'student')
+
+@admin.register(Score)
+class ScoreAdmin(BigTableAdmin):
+    list_display = ('group', 'team_base_score')
+    list_select_related = ('group',)
+    search_fields = ('group__name',)
+    autocomplete_fields = ('group',)
@@ -0,0 +1,99 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, get_user
+from django.contrib.auth.models import AnonymousUser
+from django.utils.crypto import constant_time_compare
+
+from .models import User
+
+MAX_ENTRIES = 1024
+# Other processes only learn about a saved User through this expiry
+TTL_SECONDS = 60
+
+
+class UserCache:
+    """Bounded, thread-safe LRU of User rows keyed by (session key, kind, user id)."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Hand out a copy so per-request attribute changes never leak between requests
+        return copy.copy(user)
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        self.invalidate_users([user_id])
+
+    def invalidate_users(self, user_ids):
+        """Drop every entry of `user_ids`; bulk User writes skip the post_save receiver that does this."""
+        user_ids = set(user_ids)
+        with self._lock:
+            for key in [k for k in self._entries if k[2] in user_ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def is_asset_path(path):
+    return path.startswith((settings.STATIC_URL, settings.MEDIA_URL))
+
+
+def get_session_user(request):
+    """
+    Return the logged-in user for this request, loading it from the database at
+    most once per session until that user is saved or the entry expires.
+    """
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None or session.session_key is None:
+        return AnonymousUser()
+
+    key = (session.session_key, 'auth', User._meta.pk.to_python(user_id))
+    user = user_cache.get(key)
+    # Same session verification django.contrib.auth.get_user does, minus the query
+    if user is not None and constant_time_compare(session.get(HASH_SESSION_KEY) or '', user.get_session_auth_hash()):
+        return user
+
+    user = get_user(request)
+    if user.is_authenticated:
+        user_cache.set(key, user)
+    return user
+
+
+def get_impersonated_user(request, user_id):
+    """Return the impersonation target for this session, or None if it no longer exists."""
+    key = (request.session.session_key, 'impersonate', User._meta.pk.to_python(user_id))
+    user = user_cache.get(key)
+    if user is None:
+        user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            user_cache.set(key, user)
+    return user
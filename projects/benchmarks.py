@@ -0,0 +1,161 @@
+"""
+Query-count and latency benchmarks for the heaviest views.
+
+Run them against a seeded database (manage.py seed_benchmark_data, then
+manage.py benchmark_views). Every scenario has a query budget recorded in
+query_budgets.json; a run that needs more queries than its budget fails, so
+an N+1 slipping back into a view is caught whatever the dataset size.
+
+Scenarios write (logins, the roster import) and clear the cache, so each runs
+in a transaction that is rolled back and against a private in-process cache:
+a run leaves the configured database and the shared cache as they were.
+"""
+import json
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Course, Group, Membership, User
+
+BUDGETS_PATH = Path(__file__).with_name('query_budgets.json')
+# Stands in for CACHES during a run, so the dashboard scenario's cache.clear() stays local
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'},
+}
+
+
+@dataclass
+class Scenario:
+    name: str
+    user: User
+    url: str
+    method: str = 'get'
+    data: object = None  # dict, or a callable returning a fresh dict (uploaded files are consumed)
+    headers: dict = field(default_factory=dict)
+    setup: object = None  # called before every request, outside the measurement
+
+
+@dataclass
+class Result:
+    name: str
+    queries: int
+    timings: list
+    budget: int = None
+
+    @property
+    def p50(self):
+        return percentile(self.timings, 50)
+
+    @property
+    def p95(self):
+        return percentile(self.timings, 95)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile, good enough for a few dozen samples."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def build_scenarios():
+    """Scenarios for the largest course in the database; needs a professor and at least one group."""
+    professor = User.objects.filter(role='professor', is_staff=True).order_by('id').first()
+    course = Course.objects.order_by('-student_count', 'id').first()
+    group = Group.objects.filter(course=course).order_by('id').first() if course else None
+    if professor is None or group is None:
+        raise ValueError("No data to benchmark: run manage.py seed_benchmark_data first")
+    student = Membership.objects.filter(group=group).select_related('user').order_by('id').first().user
+
+    roster = 'student_id,name\n' + ''.join(
+        f'{sid},{name}\n' for sid, name in course.students.order_by('id').values_list('student_id', 'first_name')
+    )
+
+    def roster_upload():
+        return {'csv_file': SimpleUploadedFile('roster.csv', roster.encode(), content_type='text/csv')}
+
+    return [
+        # Looked up per call: cache.clear would bind the cache configured now, not BENCHMARK_CACHES
+        Scenario('dashboard', student, reverse('dashboard'), setup=lambda: cache.clear()),
+        Scenario('dashboard (cached)', student, reverse('dashboard')),
+        Scenario('professor_dashboard', professor, reverse('professor_dashboard')),
+        Scenario('course_detail', professor, reverse('course_detail', args=[course.id])),
+        Scenario('grade_group', professor, reverse('grade_group', args=[group.id])),
+        Scenario('grading_sheet', professor, reverse('grading_sheet', args=[course.id])),
+        Scenario('export_grades_csv', professor, f"{reverse('export_grades_csv')}?course_id={course.id}"),
+        Scenario('export_grades_csv (all)', professor, reverse('export_grades_csv')),
+        Scenario('import_csv', professor, reverse('admin:course-import-csv', args=[course.id]),
+                 method='post', data=roster_upload),
+    ]
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def run_scenario(scenario, iterations=10, warmup=1):
+    """Time `iterations` requests; the query count reported is the highest seen."""
+    with rolled_back():
+        return _run_scenario(scenario, iterations, warmup)
+
+
+def _run_scenario(scenario, iterations, warmup):
+    client = Client()
+    client.force_login(scenario.user)
+    queries, timings = 0, []
+    for i in range(warmup + iterations):
+        if scenario.setup:
+            scenario.setup()
+        data = scenario.data() if callable(scenario.data) else scenario.data
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, scenario.method)(scenario.url, data, headers=scenario.headers)
+            if response.streaming:
+                # Streaming views do their queries while the body is consumed
+                for _ in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            raise AssertionError(f"{scenario.name}: HTTP {response.status_code}")
+        if i >= warmup:
+            timings.append(elapsed)
+            queries = max(queries, len(captured))
+    return Result(scenario.name, queries, timings)
+
+
+def run_benchmarks(scenarios=None, iterations=10, budgets=None):
+    # The test client talks to "testserver", which the deployed ALLOWED_HOSTS will not list
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], CACHES=BENCHMARK_CACHES):
+        results = [run_scenario(s, iterations) for s in scenarios or build_scenarios()]
+    budgets = load_budgets() if budgets is None else budgets
+    for result in results:
+        result.budget = budgets.get(result.name)
+    return results
+
+
+def load_budgets(path=BUDGETS_PATH):
+    try:
+        return json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def save_budgets(results, path=BUDGETS_PATH):
+    budgets = {**load_budgets(path), **{r.name: r.queries for r in results}}
+    Path(path).write_text(json.dumps(budgets, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,44 @@
+from django.db import connections
+from django.utils import timezone
+
+from .models import DashboardStamp, Membership
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 10
+
+
+def dashboard_cache_key(user_id, version):
+    # A new version is a new key: stale renders are never deleted, just no longer read
+    stamp = version.timestamp() if version else 0
+    return f'projects:dashboard:{user_id}:{stamp}'
+
+
+def dashboard_version(user_id):
+    """The user's DashboardStamp time, or None if their dashboard never changed."""
+    return DashboardStamp.objects.filter(user_id=user_id).values_list('changed_at', flat=True).first()
+
+
+async def adashboard_version(user_id):
+    return await DashboardStamp.objects.filter(user_id=user_id).values_list('changed_at', flat=True).afirst()
+
+
+def invalidate_dashboards(user_ids):
+    """Bump the dashboard version of `user_ids` in one upsert, inside the caller's transaction."""
+    stamps = [DashboardStamp(user_id=user_id, changed_at=timezone.now()) for user_id in set(user_ids)]
+    if not stamps:
+        return
+    # MySQL upserts on any unique key and takes no conflict target
+    features = connections[DashboardStamp.objects.db].features
+    DashboardStamp.objects.bulk_create(
+        stamps, update_conflicts=True, update_fields=['changed_at'],
+        unique_fields=['user'] if features.supports_update_conflicts_with_target else None,
+    )
+
+
+def invalidate_groupmate_dashboards(user_ids):
+    """
+    Bump the dashboards of `user_ids` and of everyone who shares a group with them,
+    for changes to a user's name or student ID: every member's card lists both.
+    """
+    user_ids = set(user_ids)
+    groups = Membership.objects.filter(user_id__in=user_ids).values('group_id')
+    invalidate_dashboards(user_ids | set(Membership.objects.filter(group_id__in=groups).values_list('user_id', flat=True)))
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .models import Submission, UploadSession
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """A chunk was rejected; `offset` is where the client should resume from."""
+
+    def __init__(self, message, offset, status=400):
+        super().__init__(message)
+        self.offset = offset
+        self.status = status
+
+
+def part_path(session):
+    return Path(settings.CHUNKED_UPLOAD_ROOT) / f'{session.id}.part'
+
+
+def start_session(user, group, type, filename, size, checksum=''):
+    """Return the matching unfinished upload so the client can resume, or start a new one."""
+    session = UploadSession.objects.filter(
+        user=user, group=group, type=type, filename=filename, size=size, checksum=checksum
+    ).order_by('-updated_at').first()
+    if session is None or not part_path(session).exists():
+        session = UploadSession.objects.create(
+            user=user, group=group, type=type, filename=filename, size=size, checksum=checksum
+        )
+        path = part_path(session)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    return session
+
+
+def _check_chunk(session, offset, length):
+    if offset != session.offset:
+        raise ChunkError("Unexpected offset", session.offset, status=409)
+    if length <= 0 or length > settings.CHUNKED_UPLOAD_CHUNK_SIZE or offset + length > session.size:
+        raise ChunkError("Invalid chunk length", session.offset)
+
+
+def _receive(stream, length, chunk_sha256, offset):
+    """Copy the chunk from the client into a temporary file next to the parts, checking it on the way."""
+    fh = tempfile.TemporaryFile(dir=settings.CHUNKED_UPLOAD_ROOT)
+    digest = hashlib.sha256()
+    received = 0
+    while received < length:
+        data = stream.read(min(READ_SIZE, length - received))
+        if not data:
+            break
+        fh.write(data)
+        digest.update(data)
+        received += len(data)
+    if received != length or (chunk_sha256 and digest.hexdigest() != chunk_sha256.lower()):
+        fh.close()
+        raise ChunkError("Chunk incomplete or checksum mismatch", offset)
+    fh.seek(0)
+    return fh
+
+
+def write_chunk(session_id, stream, offset, length, chunk_sha256=None):
+    """
+    Write `length` bytes read from `stream` at `offset` and return the new offset.
+
+    The body is first read from the client into a temporary file, in small reads and
+    without holding a transaction, so a slow client ties up neither the session row
+    nor a database connection. Only the local copy into the part file happens under
+    the row lock, after checking again that no other chunk got there first.
+    """
+    _check_chunk(UploadSession.objects.get(id=session_id), offset, length)
+    with _receive(stream, length, chunk_sha256, offset) as chunk, transaction.atomic():
+        # Serializes concurrent chunks for the same upload
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        _check_chunk(session, offset, length)
+        try:
+            fh = open(part_path(session), 'r+b')
+        except FileNotFoundError:
+            raise ChunkError("Upload data is missing; start the upload again", 0, status=404)
+        with fh:
+            fh.seek(offset)
+            shutil.copyfileobj(chunk, fh, READ_SIZE)
+            fh.truncate(offset + length)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+        session.offset = offset + length
+        session.save(update_fields=['offset', 'updated_at'])
+    return session.offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def assemble(session):
+    """
+    Verify the finished upload and turn it into a Submission, streaming the file into storage.
+
+    Runs under the session's row lock, like write_chunk, and deletes the session in the
+    same transaction: a repeated or concurrent completion waits, then finds the session
+    gone instead of creating a second Submission from the same part file.
+    """
+    path = part_path(session)
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session.pk).first()
+        if session is None:
+            raise ChunkError("Upload is already complete", 0, status=404)
+        if not path.exists():
+            raise ChunkError("Upload data is missing; start the upload again", 0, status=404)
+        if session.offset != session.size or path.stat().st_size != session.size:
+            raise ChunkError("Upload is not complete", session.offset)
+        checksum = file_sha256(path)
+        if session.checksum and checksum != session.checksum.lower():
+            raise ChunkError("Checksum mismatch", session.offset)
+
+        submission = Submission(group_id=session.group_id, type=session.type)
+        with open(path, 'rb') as fh:
+            submission.file.save(session.filename, File(fh), save=False)
+        submission.save()
+        session.delete()
+    path.unlink(missing_ok=True)
+    return submission, checksum
+
+
+def discard(session):
+    part_path(session).unlink(missing_ok=True)
+    session.delete()
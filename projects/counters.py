@@ -0,0 +1,47 @@
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Course, Group, Membership, Submission
+
+COUNTER_FIELDS = ('student_count', 'group_count', 'confirmed_group_count', 'submission_count')
+
+
+def _count(queryset, group_by):
+    return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')), 0)
+
+
+def counter_expressions():
+    enrollments = Course.students.through.objects.filter(course_id=OuterRef('pk'))
+    groups = Group.objects.filter(course_id=OuterRef('pk'))
+    members = Membership.objects.filter(group_id=OuterRef('pk'))
+    return {
+        'student_count': _count(enrollments, 'course_id'),
+        'group_count': _count(groups, 'course_id'),
+        # A group counts as confirmed once it has members and none of them is still pending
+        'confirmed_group_count': _count(
+            groups.filter(Exists(members), ~Exists(members.filter(is_confirmed=False))), 'course_id'
+        ),
+        'submission_count': _count(Submission.objects.filter(group__course_id=OuterRef('pk')), 'group__course_id'),
+    }
+
+
+def refresh_course_counters(course_ids=None, fields=COUNTER_FIELDS):
+    """
+    Recompute the stored counters of the given courses (all courses if None) in a
+    single UPDATE, so concurrent changes can never leave them drifting. The same
+    statement bumps Course.updated_at, the version stamp of the course pages.
+    """
+    courses = Course.objects.all()
+    if course_ids is not None:
+        course_ids = {c for c in course_ids if c is not None}
+        if not course_ids:
+            return 0
+        courses = courses.filter(id__in=course_ids)
+    expressions = counter_expressions()
+    return courses.update(updated_at=timezone.now(), **{field: expressions[field] for field in fields})
+
+
+def touch_courses(course_ids):
+    """Bump Course.updated_at for changes the counters do not see; `course_ids` may be a subquery."""
+    return Course.objects.filter(id__in=course_ids).update(updated_at=timezone.now())
@@ -0,0 +1,198 @@
+import mimetypes
+import os
+import re
+import zipfile
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Types a browser may show inline: none of them can run script. Anything else (HTML, SVG,
+# XML, ...) comes from a student-supplied filename and is always sent as an attachment.
+INLINE_TYPES = {'application/pdf', 'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'text/plain'}
+
+
+class RangedFile:
+    """
+    File wrapper that stops after `length` bytes from `start`.
+
+    It keeps fileno()/tell() so a WSGI server's file_wrapper (gunicorn) can still use
+    os.sendfile, sending exactly Content-Length bytes from the current offset.
+    """
+
+    def __init__(self, fh, start, length):
+        self.fh = fh
+        self.name = fh.name
+        self.remaining = length
+        fh.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def tell(self):
+        return self.fh.tell()
+
+    def seek(self, *args):
+        return self.fh.seek(*args)
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.fh.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single satisfiable byte range, None to send
+    the whole file, or False if the range cannot be satisfied."""
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match or match.groups() == ('', ''):
+        # Missing, malformed or multi-range requests get the full body
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_file(request, path, filename, as_attachment=False, offload_path=None):
+    """
+    Send a local file with ETag/Last-Modified, conditional GET and single-range support.
+
+    With settings.SENDFILE_BACKEND set, the bytes are left to the front-end server:
+    'x-accel-redirect' (nginx, serving `offload_path` under SENDFILE_URL_PREFIX) or
+    'x-sendfile' (Apache/lighttpd, serving the absolute path). Otherwise a FileResponse
+    is returned, which gunicorn hands to os.sendfile.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File is missing")
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    as_attachment = as_attachment or content_type not in INLINE_TYPES
+    backend = getattr(settings, 'SENDFILE_BACKEND', '')
+    if backend:
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.SENDFILE_URL_PREFIX + (offload_path or os.path.basename(path))
+        else:
+            response['X-Sendfile'] = os.fspath(path)
+        _set_file_headers(response, filename, as_attachment, etag, last_modified)
+        return response
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    fh = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(RangedFile(fh, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    else:
+        response = FileResponse(fh, content_type=content_type)
+    _set_file_headers(response, filename, as_attachment, etag, last_modified)
+    return response
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _set_file_headers(response, filename, as_attachment, etag, last_modified):
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Submissions are private: never let shared caches keep them
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    # Uploaded content is untrusted: no sniffing it into HTML, and no script or same-origin access if opened
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+
+
+class _ZipSink:
+    """Write-only, unseekable buffer that zipfile writes into and the response drains."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(entries, read_size=64 * 1024):
+    """
+    Yield a ZIP archive built on the fly from `entries`, an iterable of
+    (archive name, modification datetime, opener) where opener() returns a binary file.
+
+    Files are stored uncompressed (submissions are mostly PDFs and archives already)
+    and copied in small reads, so memory stays constant however big the bundle gets.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for name, modified, opener in entries:
+            try:
+                src = opener()
+            except OSError:
+                # Missing files are skipped rather than aborting a download already in flight
+                continue
+            info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6])
+            with src, archive.open(info, mode='w', force_zip64=True) as dest:
+                for block in iter(lambda: src.read(read_size), b''):
+                    dest.write(block)
+                    yield from _pending(sink)
+            yield from _pending(sink)
+    # Central directory, written when the archive closes
+    yield from _pending(sink)
+
+
+def _pending(sink):
+    data = sink.drain()
+    if data:
+        yield data
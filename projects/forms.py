@@ -1,17 +1,48 @@
 from django import forms
-from .models import User, Group, Submission, Contribution, Score
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from .models import User, Group, Membership, Submission, Contribution, Score
 
 class CSVImportForm(forms.Form):
     csv_file = forms.FileField()
 
+def member_label(user):
+    return f"{user.first_name} ({user.student_id[-2:] if user.student_id else ''})"
+
+def eligible_students(course, leader, group=None):
+    """
+    Students `leader` may add to a group in `course`: enrolled, not the leader, and
+    not in another group of that course (members of `group` itself stay eligible).
+    Membership is checked with a single NOT EXISTS anti-join.
+    """
+    taken = Membership.objects.filter(user=OuterRef('pk'))
+    if course is not None:
+        taken = taken.filter(group__course=course)
+    if group is not None and group.pk:
+        taken = taken.exclude(group=group)
+    qs = User.objects.filter(role='student').filter(~Exists(taken))
+    if leader is not None:
+        qs = qs.exclude(id=leader.id)
+    if course is not None:
+        qs = qs.filter(enrolled_courses=course)
+    return qs
+
+def search_students(queryset, query):
+    """Prefix search on student ID or name, both indexed."""
+    query = query.strip()
+    if not query:
+        return queryset
+    return queryset.filter(Q(student_id__startswith=query) | Q(first_name__istartswith=query))
+
 class StudentMultipleChoiceField(forms.ModelMultipleChoiceField):
     def label_from_instance(self, obj):
-        return f"{obj.first_name} ({obj.student_id[-2:] if obj.student_id else ''})"
+        return member_label(obj)
 
 class GroupForm(forms.ModelForm):
+    # Chosen through the typeahead picker (search_members), which posts one hidden input per member
     members = StudentMultipleChoiceField(
         queryset=User.objects.filter(role='student'),
-        widget=forms.CheckboxSelectMultiple,
+        widget=forms.MultipleHiddenInput,
         required=True
     )
 
@@ -39,39 +70,50 @@ class GroupForm(forms.ModelForm):
         course = kwargs.pop('course', None)
         super().__init__(*args, **kwargs)
         if self.user:
-            # Filtering logic:
-            # 1. Students only
-            # 2. Exclude the current leader
-            # 3. Exclude students already in ANY group for THIS course (except those already in this group if editing)
-            
             # Use provided course or get from instance
             current_course = course or (self.instance.course if self.instance and self.instance.pk else None)
-            
-            qs = User.objects.filter(role='student').exclude(id=self.user.id)
-            
-            if current_course:
-                # enrolled in this course
-                qs = qs.filter(enrolled_courses=current_course)
-                
-                # exclude people in other groups of this same course
-                other_groups_members = User.objects.filter(
-                    joined_groups__course=current_course
-                )
-                if self.instance and self.instance.pk:
-                    other_groups_members = other_groups_members.exclude(joined_groups=self.instance)
-                
-                qs = qs.exclude(id__in=other_groups_members)
-            else:
-                # fall back to global exclusion if no course context (safety)
-                qs = qs.exclude(joined_groups__isnull=False)
-                
-            self.fields['members'].queryset = qs
+            self.fields['members'].queryset = eligible_students(current_course, self.user, self.instance)
+
+    def selected_members(self):
+        """The members currently picked (submitted or initial), for rendering the picker's chips."""
+        value = self['members'].value() or []
+        ids = [pk for pk in (str(v) for v in value) if pk.isdigit()]
+        if not ids:
+            return []
+        return [(user, member_label(user)) for user in
+                self.fields['members'].queryset.filter(pk__in=ids).order_by('student_id')]
+
+def check_submission_size(size):
+    if size > settings.SUBMISSION_MAX_SIZE:
+        raise forms.ValidationError(f"檔案不可超過 {settings.SUBMISSION_MAX_SIZE // (1024 * 1024)} MB。")
 
 class SubmissionForm(forms.ModelForm):
+    """The plain upload form, for browsers without JavaScript; same size limit as the chunked path."""
+
     class Meta:
         model = Submission
         fields = ['type', 'file']
 
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        check_submission_size(file.size)
+        return file
+
+class ChunkedUploadForm(forms.Form):
+    type = forms.ChoiceField(choices=Submission.TYPE_CHOICES)
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+    checksum = forms.RegexField(regex=r'^[0-9a-fA-F]{64}$', required=False)
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        check_submission_size(size)
+        return size
+
+class DirectUploadForm(ChunkedUploadForm):
+    # Signed into the presigned URL, so object storage itself verifies the upload
+    checksum = forms.RegexField(regex=r'^[0-9a-fA-F]{64}$')
+
 class ContributionForm(forms.ModelForm):
     class Meta:
         model = Contribution
@@ -81,3 +123,35 @@ class ScoreForm(forms.ModelForm):
     class Meta:
         model = Score
         fields = ['team_base_score', 'professor_notes']
+
+class GradingRowForm(ScoreForm):
+    """One group's row of the grading sheet: ScoreForm plus an adjustment field per member."""
+
+    def __init__(self, *args, members=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.members = list(members)
+        adjustments = self.instance.individual_adjustments or {}
+        for member in self.members:
+            self.fields[self.adjustment_field(member)] = forms.DecimalField(
+                max_digits=5, decimal_places=2, required=False, initial=adjustments.get(member.student_id)
+            )
+
+    @staticmethod
+    def adjustment_field(member):
+        return f'adj_{member.id}'
+
+    def adjustment_fields(self):
+        """(member, bound field) pairs, for rendering next to each name."""
+        return [(member, self[self.adjustment_field(member)]) for member in self.members]
+
+    def save(self, commit=True):
+        # Keyed by student ID; blank means no adjustment, and non-members' entries are kept
+        adjustments = dict(self.instance.individual_adjustments or {})
+        for member in self.members:
+            value = self.cleaned_data.get(self.adjustment_field(member))
+            if value is None:
+                adjustments.pop(member.student_id, None)
+            else:
+                adjustments[member.student_id] = float(value)
+        self.instance.individual_adjustments = adjustments
+        return super().save(commit)
@@ -0,0 +1,189 @@
+"""
+Final grades for a whole course in one vectorised pass.
+
+A student's grade is put together from three stored pieces: the group's
+Score.team_base_score, the member's Contribution.percentage and their entry in
+Score.individual_adjustments (keyed by student ID). One query reads a course's
+roster (projects.roster), the pieces become NumPy arrays, and every final grade is computed
+at once:
+
+    factor = clip(percentage / (100 / group size), min_factor, max_factor)
+    grade  = team score * ((1 - weight) + weight * factor) + adjustment
+
+then clamped, optionally curved across the course, and clamped again. Members
+without a contribution count as an equal share; groups without a score stay
+ungraded (NaN). The policy comes from settings.GRADE_POLICY.
+"""
+import itertools
+import math
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+
+from .models import CourseRosterRow
+
+CURVES = ('', 'shift', 'sqrt')
+
+
+@dataclass(frozen=True)
+class GradePolicy:
+    # 0 gives everyone the team score; 1 scales it fully by contribution relative to an equal share
+    contribution_weight: float = 0.5
+    min_contribution_factor: float = 0.0
+    max_contribution_factor: float = 1.2
+    min_grade: float = 0.0
+    max_grade: float = 100.0
+    # '' for none, 'shift' to raise the course mean to target_mean (never lowers it),
+    # 'sqrt' for the classic max * sqrt(grade / max)
+    curve: str = ''
+    target_mean: float = 75.0
+
+    def __post_init__(self):
+        if self.curve not in CURVES:
+            raise ValueError(f"Unknown curve {self.curve!r}; expected one of {CURVES}")
+        if not 0 <= self.contribution_weight <= 1:
+            raise ValueError("contribution_weight must be between 0 and 1")
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**getattr(settings, 'GRADE_POLICY', {}))
+
+
+def final_grades(team_score, contribution, group_index, adjustment, policy):
+    """
+    Final grade per student. Arrays are aligned per student: team_score and
+    contribution are floats with NaN for missing, group_index holds dense group
+    numbers (0..groups-1) used to find each group's size.
+    """
+    team_score = np.asarray(team_score, dtype=np.float64)
+    if team_score.size == 0:
+        return team_score
+    contribution = np.asarray(contribution, dtype=np.float64)
+    group_size = np.bincount(group_index)[group_index]
+
+    factor = np.where(np.isnan(contribution), 1.0, contribution * group_size / 100.0)
+    np.clip(factor, policy.min_contribution_factor, policy.max_contribution_factor, out=factor)
+    weight = policy.contribution_weight
+    grade = team_score * ((1.0 - weight) + weight * factor) + adjustment
+    np.clip(grade, policy.min_grade, policy.max_grade, out=grade)
+
+    graded = ~np.isnan(grade)
+    if policy.curve == 'shift' and graded.any():
+        grade += max(policy.target_mean - grade[graded].mean(), 0.0)
+    elif policy.curve == 'sqrt' and policy.max_grade > 0:
+        grade = np.sqrt(np.maximum(grade, 0.0) / policy.max_grade) * policy.max_grade
+    np.clip(grade, policy.min_grade, policy.max_grade, out=grade)
+    return np.round(grade, 2)
+
+
+class StudentGrade(NamedTuple):
+    student_id: str
+    name: str
+    group_id: int
+    group_name: str
+    project_name: str
+    team_score: object  # Decimal, or None when the group is ungraded
+    contribution: object  # Decimal, or None when not filled in
+    contribution_description: str
+    adjustment: float
+    final: float  # NaN when the group is ungraded
+
+    @property
+    def graded(self):
+        return not math.isnan(self.final)
+
+
+# Order of the columns grade_rows() returns
+ROW_FIELDS = (
+    'course_id', 'group_id', 'student_number', 'student_name', 'group_name', 'project_name',
+    'team_base_score', 'individual_adjustments', 'contribution_percentage', 'contribution_description',
+)
+
+
+def grade_rows(course=None):
+    """Every grouped student with their grade inputs as ROW_FIELDS tuples, read from the course roster."""
+    rows = CourseRosterRow.objects.filter(group__isnull=False)
+    if course is not None:
+        rows = rows.filter(course=course)
+    return rows.order_by('course_id', 'group_id', 'student_number').values_list(*ROW_FIELDS)
+
+
+def _adjustment(adjustments, student_id):
+    # individual_adjustments is free-form JSON, so anything unusable counts as no adjustment
+    if not isinstance(adjustments, dict):
+        return 0.0
+    try:
+        return float(adjustments.get(student_id) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else float(value)
+
+
+class CourseGrades:
+    """One course's grades, in group order; StudentGrade rows are built lazily on iteration."""
+
+    def __init__(self, rows, policy=None):
+        policy = policy or GradePolicy.from_settings()
+        self._rows = rows
+        count = len(rows)
+
+        def column(name):
+            return map(itemgetter(ROW_FIELDS.index(name)), rows)
+
+        self.student_ids = list(column('student_number'))
+        self.team_score = np.fromiter(map(_nan_if_none, column('team_base_score')), np.float64, count)
+        self.contribution = np.fromiter(map(_nan_if_none, column('contribution_percentage')), np.float64, count)
+        self.adjustment = np.fromiter(
+            map(_adjustment, column('individual_adjustments'), self.student_ids), np.float64, count,
+        )
+        _, self.group_index = np.unique(np.fromiter(column('group_id'), np.int64, count), return_inverse=True)
+        self.final = final_grades(self.team_score, self.contribution, self.group_index, self.adjustment, policy)
+
+    def __iter__(self):
+        for (_, gid, sid, name, gname, project, team, _, pct, desc), adj, final in zip(
+            self._rows, self.adjustment.tolist(), self.final.tolist()
+        ):
+            yield StudentGrade(sid, name, gid, gname, project, team, pct, desc or '', adj, final)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def by_student(self):
+        """{student_id: final grade} for graded students."""
+        return {sid: final for sid, final in zip(self.student_ids, self.final.tolist()) if not math.isnan(final)}
+
+
+def iter_course_grades(course=None, policy=None, chunk_size=2000):
+    """
+    CourseGrades for `course`, or for every course one after the other. A single
+    query streams the rows; only one course is held in memory at a time, since
+    curving needs the whole course.
+    """
+    policy = policy or GradePolicy.from_settings()
+    rows = grade_rows(course).iterator(chunk_size=chunk_size)
+    for _, course_rows in itertools.groupby(rows, key=itemgetter(0)):
+        yield CourseGrades(list(course_rows), policy)
+
+
+def course_grades(course, policy=None):
+    return next(iter_course_grades(course, policy), None) or CourseGrades([], policy)
+
+
+def group_grades(group, policy=None):
+    """
+    StudentGrades of one group. Grades depend only on the group itself, so just its
+    roster rows are read; the 'shift' curve is the exception, as it needs the mean
+    of the whole course.
+    """
+    policy = policy or GradePolicy.from_settings()
+    if group.course_id is None:
+        return []
+    if policy.curve == 'shift':
+        return [row for row in course_grades(group.course_id, policy) if row.group_id == group.id]
+    return list(CourseGrades(list(grade_rows(group.course_id).filter(group=group)), policy))
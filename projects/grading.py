@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import live
+from .models import Contribution, CourseRosterRow, Group, Membership, Score, Submission
+from .roster import refresh_roster_rows
+
+SCORE_FIELDS = ['team_base_score', 'individual_adjustments', 'professor_notes']
+
+
+def grading_sheet_groups(course):
+    """
+    Every group of `course` with what the grading sheet shows, in five queries:
+    groups (+ score), members, contributions and latest submissions.
+    """
+    return Group.objects.filter(course=course).select_related('score').prefetch_related(
+        Prefetch('membership_set', queryset=Membership.objects.select_related('user').order_by('id')),
+        Prefetch('contribution_set', queryset=Contribution.objects.select_related('student').order_by('id')),
+        Prefetch(
+            'submission_set',
+            queryset=Submission.objects.latest_versions().order_by('type'),
+            to_attr='latest_submissions',
+        ),
+    ).order_by('id')
+
+
+def sheet_grade_rows(groups):
+    """grade_engine.grade_rows()-shaped tuples from grading_sheet_groups(), without another query."""
+    rows = []
+    for group in groups:
+        score = getattr(group, 'score', None)
+        if score is not None and score.pk is None:
+            # The sheet's unsaved placeholder for a group nobody has graded yet
+            score = None
+        contributions = {}
+        for contribution in group.contribution_set.all():
+            contributions.setdefault(contribution.student_id, contribution)
+        for membership in group.membership_set.all():
+            contribution = contributions.get(membership.user_id)
+            rows.append((
+                group.course_id, group.id, membership.user.student_id, membership.user.first_name,
+                group.name, group.project_name,
+                score.team_base_score if score else None, score.individual_adjustments if score else None,
+                contribution.percentage if contribution else None, contribution.description if contribution else None,
+            ))
+    return rows
+
+
+def save_scores(course, scores):
+    """Insert new and update existing Score rows in one transaction, a statement per kind."""
+    new = [score for score in scores if score.pk is None]
+    existing = [score for score in scores if score.pk is not None]
+    now = timezone.now()
+    for score in existing:
+        # bulk_update() leaves auto_now fields alone
+        score.updated_at = now
+    with transaction.atomic():
+        Score.objects.bulk_create(new)
+        Score.objects.bulk_update(existing, [*SCORE_FIELDS, 'updated_at'])
+        # Bulk writes skip post_save, so refresh the roster and tell the live course page ourselves
+        refresh_roster_rows(CourseRosterRow.objects.filter(group_id__in=[score.group_id for score in scores]))
+        for score in scores:
+            live.publish(course.id, score.group_id, 'score')
+    return len(scores)
@@ -1,4 +1,5 @@
 from django.http import HttpResponse
+from django.template.loader import render_to_string
 
 def htmx_redirect(url):
     response = HttpResponse()
@@ -8,3 +9,19 @@ def htmx_redirect(url):
 def htmx_push_url(response, url):
     response['HX-Push-Url'] = url
     return response
+
+def is_htmx(request):
+    return request.headers.get('HX-Request') == 'true'
+
+def render_partial(request, template_name, context=None, oob=()):
+    """
+    Render `template_name` for the request's hx-target, followed by out-of-band fragments.
+
+    `oob` is an iterable of (template_name, context) pairs. Each fragment template must
+    have a single root element with an id, and add hx-swap-oob="true" when `oob` is set
+    in its context, so the same template also works inside a full page render.
+    """
+    parts = [render_to_string(template_name, context, request=request)]
+    for fragment_name, fragment_context in oob:
+        parts.append(render_to_string(fragment_name, {**fragment_context, 'oob': True}, request=request))
+    return HttpResponse(''.join(parts))
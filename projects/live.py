@@ -0,0 +1,72 @@
+"""
+Per-course change feed for the professors' live progress board.
+
+Signals publish small events ("group 12 changed: membership/submission/score")
+into the shared cache under a per-course sequence number; the SSE view in
+projects.views polls the cache (never the database) for anything newer than
+the last sequence it sent, then re-renders only the affected group rows.
+Going through the cache lets any worker serve the stream, as long as CACHES
+points at a shared backend (REDIS_URL) rather than the per-process default.
+The board is only offered when settings.LIVE_COURSE_UPDATES is on: ASGI plus
+a shared cache.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+EVENT_TIMEOUT = 60 * 60
+POLL_INTERVAL = 1
+HEARTBEAT_INTERVAL = 15
+# Streams end after this long and EventSource reconnects, so no connection lives forever
+STREAM_DURATION = 5 * 60
+# Clients further behind than this skip ahead; a page reload catches them up anyway
+MAX_BACKLOG = 200
+
+
+def _sequence_key(course_id):
+    return f'projects:live:{course_id}:seq'
+
+
+def _event_key(course_id, seq):
+    return f'projects:live:{course_id}:{seq}'
+
+
+def publish(course_id, group_id, kind):
+    """Record a change to `group_id` once the surrounding transaction commits."""
+    if course_id is None:
+        return
+
+    def send():
+        key = _sequence_key(course_id)
+        cache.add(key, 0, None)
+        try:
+            seq = cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(): start over
+            cache.set(key, 1, None)
+            seq = 1
+        cache.set(_event_key(course_id, seq), {'group_id': group_id, 'kind': kind}, EVENT_TIMEOUT)
+
+    transaction.on_commit(send)
+
+
+async def acurrent_sequence(course_id):
+    return await cache.aget(_sequence_key(course_id), 0)
+
+
+async def aevents_since(course_id, last_seq):
+    """(latest sequence, [event dicts]) for everything published after `last_seq`."""
+    current = await acurrent_sequence(course_id)
+    if current <= last_seq:
+        # Nothing new, or the counter was evicted and restarted: callers continue from `current`
+        return current, []
+    first = max(last_seq + 1, current - MAX_BACKLOG + 1)
+    found = await cache.aget_many([_event_key(course_id, seq) for seq in range(first, current + 1)])
+    return current, list(found.values())
+
+
+def format_event(event, data, id=None):
+    """One Server-Sent Events message; every line of `data` gets its own data: field."""
+    lines = [f'id: {id}'] if id is not None else []
+    lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
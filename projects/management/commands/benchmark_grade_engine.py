@@ -0,0 +1,88 @@
+import random
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.benchmarks import percentile
+from projects.grade_engine import CourseGrades, GradePolicy, course_grades, final_grades
+from projects.models import Course
+
+
+def reference_grades(rows, policy):
+    """The same formula one student at a time, as a baseline (and a cross-check) for the engine."""
+    sizes = {}
+    for row in rows:
+        sizes[row[1]] = sizes.get(row[1], 0) + 1
+    grades = []
+    for _, group_id, student_id, _, _, _, team, adjustments, pct, _ in rows:
+        if team is None:
+            grades.append(None)
+            continue
+        factor = 1.0 if pct is None else float(pct) * sizes[group_id] / 100
+        factor = min(max(factor, policy.min_contribution_factor), policy.max_contribution_factor)
+        weight = policy.contribution_weight
+        grade = float(team) * ((1 - weight) + weight * factor) + float(adjustments.get(student_id, 0))
+        grades.append(min(max(grade, policy.min_grade), policy.max_grade))
+    return grades
+
+
+class Command(BaseCommand):
+    help = (
+        "Time final-grade computation for a synthetic course (50,000 students by default) with the "
+        "NumPy engine and with a per-student loop; --course also times a real course end to end"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50_000)
+        parser.add_argument('--group-size', type=int, default=4)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--course', type=int, help="ID of a course to load from the database as well")
+
+    def handle(self, *args, **options):
+        policy = GradePolicy.from_settings()
+        rows = self.synthetic_rows(options['students'], options['group_size'], random.Random(options['seed']))
+        grades = CourseGrades(rows, policy)
+
+        self.stdout.write(f"{options['students']} students, policy: {policy}")
+        self.stdout.write(f"{'step':<28}{'p50 ms':>10}{'p95 ms':>10}")
+        self.report("engine, arrays only", options['iterations'], lambda: final_grades(
+            grades.team_score, grades.contribution, grades.group_index, grades.adjustment, policy))
+        self.report("engine, from query rows", options['iterations'], lambda: CourseGrades(rows, policy))
+        self.report("per-student loop", options['iterations'], lambda: reference_grades(rows, policy))
+        if policy.curve == '':
+            # Curves need the course-wide pass, which the loop does not attempt
+            expected = np.array([np.nan if g is None else g for g in reference_grades(rows, policy)])
+            if not np.allclose(grades.final, expected, atol=0.005, equal_nan=True):
+                raise CommandError("Engine and per-student results disagree")
+
+        if options['course'] is not None:
+            course = Course.objects.filter(id=options['course']).first()
+            if course is None:
+                raise CommandError(f"Course {options['course']} does not exist")
+            self.report(f"course {course.id}, query included", options['iterations'],
+                        lambda: course_grades(course, policy))
+
+    def report(self, name, iterations, func):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(f"{name:<28}{percentile(timings, 50) * 1000:>10.1f}{percentile(timings, 95) * 1000:>10.1f}")
+
+    @staticmethod
+    def synthetic_rows(students, group_size, rng):
+        """Tuples shaped like grade_engine.grade_rows(): most groups scored, some contributions missing."""
+        rows = []
+        for group_id in range((students + group_size - 1) // group_size):
+            members = range(group_id * group_size, min((group_id + 1) * group_size, students))
+            team = Decimal(rng.randint(5000, 10000)) / 100 if rng.random() < 0.9 else None
+            adjustments = {f'S{i:06d}': rng.choice([-5, 2.5, 5]) for i in members if rng.random() < 0.1}
+            for i in members:
+                pct = Decimal(rng.randint(1000, 4000)) / 100 if rng.random() < 0.8 else None
+                rows.append((1, group_id, f'S{i:06d}', f'Student {i}', f'Group {group_id}', 'Project',
+                             team, adjustments, pct, ''))
+        return rows
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.passwords import default_workers, hash_passwords
+
+
+class Command(BaseCommand):
+    help = "Time batch password hashing with 1..N worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help="Number of passwords to hash per run")
+        parser.add_argument('--max-workers', type=int, default=default_workers())
+
+    def handle(self, *args, **options):
+        count = options['count']
+        passwords = [f"{i:04d}" for i in range(count)]
+        workers_to_try = sorted({1, 2, 4, 8, options['max_workers']} & set(range(1, options['max_workers'] + 1)))
+
+        baseline = None
+        for workers in workers_to_try:
+            start = time.perf_counter()
+            hash_passwords(passwords, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{workers:>2} worker(s): {elapsed:6.2f}s  "
+                f"{count / elapsed:8.1f} hashes/s  speedup x{baseline / elapsed:.2f}"
+            )
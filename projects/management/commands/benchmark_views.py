@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.benchmarks import build_scenarios, run_benchmarks, save_budgets
+
+
+class Command(BaseCommand):
+    help = "Report query counts and p50/p95 latency per view; fails when a view exceeds its query budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--only', nargs='*', default=[], help="Scenario names to run (default: all)")
+        parser.add_argument('--record', action='store_true', help="Save the observed query counts as the new budgets")
+
+    def handle(self, *args, **options):
+        try:
+            scenarios = build_scenarios()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['only']:
+            scenarios = [s for s in scenarios if s.name in options['only']]
+
+        results = run_benchmarks(scenarios, options['iterations'])
+        self.stdout.write(f"{'view':<26}{'queries':>8}{'budget':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        for r in results:
+            line = (
+                f"{r.name:<26}{r.queries:>8}{r.budget if r.budget is not None else '-':>8}"
+                f"{r.p50 * 1000:>10.1f}{r.p95 * 1000:>10.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if r.over_budget and not options['record'] else line)
+
+        if options['record']:
+            save_budgets(results)
+            self.stdout.write(self.style.SUCCESS("Query budgets recorded"))
+            return
+        over = [r.name for r in results if r.over_budget]
+        if over:
+            raise CommandError(f"Over query budget: {', '.join(over)}")
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.chunked_upload import discard
+from projects.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that have not received data for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=72)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = UploadSession.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for session in stale.iterator():
+            discard(session)
+            count += 1
+        self.stdout.write(f"Removed {count} stale uploads")
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from projects.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit running servers with concurrent requests and compare throughput, e.g. the WSGI and the "
+        "ASGI deployment side by side: ./start.sh with SERVER_MODE unset on one port and "
+        "SERVER_MODE=asgi on another, then --url for each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True, help="Base URL of a server; repeat to compare")
+        parser.add_argument('--username', default='bench_prof')
+        parser.add_argument('--password', default='benchmark')
+        parser.add_argument('--paths', nargs='+', default=['/professor/'], help="Paths requested in turn")
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=500, help="Requests per server")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'server':<32}{'ok':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for base_url in options['url']:
+            base_url = base_url.rstrip('/')
+            opener = self.login(base_url, options['username'], options['password'])
+            urls = [base_url + path for path in options['paths']]
+            ok, errors, timings, elapsed = self.run(opener, urls, options['requests'], options['concurrency'])
+            self.stdout.write(
+                f"{base_url:<32}{ok:>7}{errors:>8}{ok / elapsed:>9.1f}"
+                f"{percentile(timings, 50) * 1000:>9.1f}{percentile(timings, 95) * 1000:>9.1f}"
+            )
+
+    def login(self, base_url, username, password):
+        """A cookie-carrying opener logged in through the regular login form."""
+        jar = CookieJar()
+        opener = build_opener(HTTPCookieProcessor(jar))
+        login_url = base_url + reverse('login')
+        try:
+            opener.open(login_url).read()
+            csrf_token = next(c.value for c in jar if c.name == settings.CSRF_COOKIE_NAME)
+            data = urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf_token})
+            opener.open(Request(login_url, data.encode(), headers={'Referer': login_url})).read()
+        except (URLError, StopIteration) as exc:
+            raise CommandError(f"Cannot log in at {login_url}: {exc}")
+        if not any(c.name == settings.SESSION_COOKIE_NAME for c in jar):
+            raise CommandError(f"Login as {username} failed at {login_url}")
+        return opener
+
+    def run(self, opener, urls, count, concurrency):
+        def fetch(i):
+            start = time.perf_counter()
+            try:
+                with opener.open(urls[i % len(urls)]) as response:
+                    response.read()
+                    success = response.status < 400
+            except (HTTPError, URLError, OSError):
+                success = False
+            return success, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, range(count)))
+        elapsed = time.perf_counter() - start
+        timings = [t for success, t in results if success] or [0]
+        ok = sum(success for success, _ in results)
+        return ok, len(results) - ok, timings, elapsed
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from projects.models import User
+
+STATIC_FINGERPRINT = '.source-fingerprint'
+
+
+def pending_migrations(database=DEFAULT_DB_ALIAS):
+    """Migrations on disk that the database has not applied yet (one query)."""
+    executor = MigrationExecutor(connections[database])
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def static_fingerprint():
+    """Hash of every static source file's path, size and mtime, as collectstatic would find them."""
+    digest = hashlib.sha256()
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            stat = os.stat(storage.path(path))
+            entries.append(f'{getattr(storage, "prefix", "") or ""}/{path}:{stat.st_size}:{stat.st_mtime_ns}')
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Everything start.sh needs before serving, in one process: migrate and collectstatic "
+        "only when something changed, and create the admin account if it is missing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Run migrate and collectstatic regardless")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.step("migrate", lambda: self.migrate(options['force']))
+        self.step("collectstatic", lambda: self.collectstatic(options['force']))
+        self.step("superuser", self.ensure_superuser)
+        self.stdout.write(f"Startup tasks finished in {time.perf_counter() - started:.2f}s")
+
+    def step(self, name, func):
+        start = time.perf_counter()
+        outcome = func()
+        self.stdout.write(f"  {name:<14} {outcome:<34} {time.perf_counter() - start:6.2f}s")
+
+    def migrate(self, force):
+        if not force and not pending_migrations():
+            return "up to date, skipped"
+        call_command('migrate', interactive=False, verbosity=0)
+        return "applied"
+
+    def collectstatic(self, force):
+        stamp = os.path.join(settings.STATIC_ROOT, STATIC_FINGERPRINT)
+        fingerprint = static_fingerprint()
+        try:
+            with open(stamp) as fh:
+                unchanged = fh.read() == fingerprint
+        except FileNotFoundError:
+            unchanged = False
+        if unchanged and not force:
+            return "unchanged, skipped"
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(stamp, 'w') as fh:
+            fh.write(fingerprint)
+        return "collected"
+
+    def ensure_superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME', 'admin')
+        if User.objects.filter(username=username).exists():
+            return "exists"
+        User.objects.create_superuser(
+            username,
+            os.environ.get('DJANGO_SUPERUSER_EMAIL', 'admin@example.com'),
+            os.environ.get('DJANGO_SUPERUSER_PASSWORD', 'admin123'),
+            role='professor', student_id='PROF01', has_changed_password=True,
+        )
+        return "created"
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from projects.counters import refresh_course_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored student/group/submission counters on every course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help="Limit to these course IDs")
+
+    def handle(self, *args, **options):
+        updated = refresh_course_counters(options['course_ids'] or None)
+        self.stdout.write(f"Rebuilt counters for {updated} courses")
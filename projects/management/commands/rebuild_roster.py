@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from projects.roster import sync_roster
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course roster read model (CourseRosterRow) from enrollments, groups, submissions and scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help="Limit to these course IDs")
+
+    def handle(self, *args, **options):
+        refreshed = sync_roster(options['course_ids'] or None)
+        self.stdout.write(f"Rebuilt {refreshed} roster rows")
@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from projects.caching import invalidate_dashboards
+from projects.counters import refresh_course_counters
+from projects.roster import sync_roster
+from projects.models import Course, Group, Membership
+
+
+def clean_course_name(name):
+    if ' (' in name:
+        return name.split(' (')[0]
+    return name.replace('{{item.course.semester}}', '').replace('()', '').strip()
+
+
+def repair_semesters():
+    """Reset semesters holding template leftovers or unknown values to '1'."""
+    course_ids = list(Course.objects.exclude(semester__in=['1', '2']).values_list('id', flat=True))
+    invalidate_course_dashboards(course_ids)
+    return Course.objects.filter(id__in=course_ids).update(semester='1', updated_at=timezone.now())
+
+
+def invalidate_course_dashboards(course_ids):
+    # Queryset updates and bulk writes skip the signals that drop cached dashboards
+    if course_ids:
+        invalidate_dashboards(Course.students.through.objects.filter(course_id__in=course_ids).values_list('user_id', flat=True))
+
+
+def repair_course_names(batch_size):
+    fixed = 0
+    courses = Course.objects.filter(name__contains='{{').only('id', 'name')
+    batch = []
+    for course in courses.iterator(chunk_size=batch_size):
+        course.name = clean_course_name(course.name)
+        course.updated_at = timezone.now()
+        batch.append(course)
+        if len(batch) >= batch_size:
+            fixed += Course.objects.bulk_update(batch, ['name', 'updated_at'])
+            invalidate_course_dashboards([c.id for c in batch])
+            batch = []
+    if batch:
+        fixed += Course.objects.bulk_update(batch, ['name', 'updated_at'])
+        invalidate_course_dashboards([c.id for c in batch])
+    return fixed
+
+
+def repair_leader_memberships(batch_size):
+    """Create a confirmed membership for every leader who lacks one."""
+    created = 0
+    leader_membership = Membership.objects.filter(group=OuterRef('pk'), user=OuterRef('leader'))
+    missing = Group.objects.filter(~Exists(leader_membership)).values_list('id', 'leader_id')
+    batch = []
+    for group_id, leader_id in missing.iterator(chunk_size=batch_size):
+        batch.append(Membership(group_id=group_id, user_id=leader_id, is_confirmed=True))
+        if len(batch) >= batch_size:
+            created += _create_memberships(batch)
+            batch = []
+    if batch:
+        created += _create_memberships(batch)
+    return created
+
+
+def _create_memberships(batch):
+    # With ignore_conflicts, bulk_create returns every object passed in, inserted or not,
+    # so count the leader memberships around the insert instead
+    leaders = Membership.objects.filter(group_id__in=[m.group_id for m in batch], user=F('group__leader'))
+    before = leaders.count()
+    Membership.objects.bulk_create(batch, ignore_conflicts=True)
+    created = leaders.count() - before
+    invalidate_group_dashboards([m.group_id for m in batch])
+    return created
+
+
+def confirm_leader_memberships():
+    unconfirmed = Membership.objects.filter(user=F('group__leader'), is_confirmed=False)
+    invalidate_group_dashboards(unconfirmed.values_list('group_id', flat=True))
+    return unconfirmed.update(is_confirmed=True, updated_at=timezone.now())
+
+
+def invalidate_group_dashboards(group_ids):
+    invalidate_dashboards(Membership.objects.filter(group_id__in=list(group_ids)).values_list('user_id', flat=True))
+
+
+class Command(BaseCommand):
+    help = "Repair course typos and leader memberships in set-based batches (safe to run on a schedule)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be repaired")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            leader_membership = Membership.objects.filter(group=OuterRef('pk'), user=OuterRef('leader'))
+            counts = {
+                'semesters': Course.objects.exclude(semester__in=['1', '2']).count(),
+                'course names': Course.objects.filter(name__contains='{{').count(),
+                'missing leader memberships': Group.objects.filter(~Exists(leader_membership)).count(),
+                'unconfirmed leaders': Membership.objects.filter(user=F('group__leader'), is_confirmed=False).count(),
+            }
+        else:
+            batch_size = options['batch_size']
+            with transaction.atomic():
+                counts = {
+                    'semesters': repair_semesters(),
+                    'course names': repair_course_names(batch_size),
+                    'missing leader memberships': repair_leader_memberships(batch_size),
+                    'unconfirmed leaders': confirm_leader_memberships(),
+                }
+                if counts['missing leader memberships'] or counts['unconfirmed leaders']:
+                    refresh_course_counters(fields=['confirmed_group_count'])
+                    sync_roster()
+        verb = "Would repair" if options['dry_run'] else "Repaired"
+        for label, count in counts.items():
+            self.stdout.write(f"{verb} {count} {label}")
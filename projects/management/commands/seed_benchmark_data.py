@@ -0,0 +1,204 @@
+import random
+from functools import partial
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from projects.auth_cache import user_cache
+from projects.counters import refresh_course_counters
+from projects.roster import sync_roster
+from projects.models import (
+    Contribution, Course, CourseRosterRow, DashboardStamp, Group, Membership, Score, StoredBlob, Submission,
+    UploadSession, User,
+)
+from projects.signals import delete_blob_if_orphaned, receivers_disconnected
+from projects.storage import digest_from_name, submission_storage
+
+USERNAME_PREFIX = 'bench'
+COURSE_PREFIX = 'Benchmark'
+PROFESSOR_USERNAME = 'bench_prof'
+PASSWORD = 'benchmark'
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Generate a large synthetic dataset (courses, students, groups, submissions) for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=2000, help="Total groups, spread over the courses")
+        parser.add_argument('--group-size', type=int, default=4)
+        parser.add_argument('--submissions', type=int, default=3, help="Submissions per group (alternating types)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, so runs are reproducible")
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated benchmark data first")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+        elif Course.objects.filter(name__startswith=COURSE_PREFIX).exists():
+            raise CommandError("Benchmark data already exists; use --clear to regenerate it")
+        if options['courses'] < 1 or options['groups'] * options['group_size'] > options['students']:
+            raise CommandError("Need at least one course and enough students to fill every group")
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            courses = self.create_courses(options['courses'])
+            students = self.create_students(options['students'])
+            per_course = self.enroll(courses, students)
+            groups = self.create_groups(rng, per_course, options['groups'], options['group_size'])
+            self.create_submissions(groups, options['submissions'])
+            self.create_contributions_and_scores(rng, groups)
+            refresh_course_counters([c.id for c in courses])
+            sync_roster([c.id for c in courses])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(courses)} courses, {len(students)} students, {len(groups)} groups, "
+            f"{Submission.objects.filter(group__course__in=courses).count()} submissions "
+            f"(log in as {PROFESSOR_USERNAME} / {PASSWORD})"
+        ))
+
+    def clear(self):
+        """
+        Delete earlier benchmark data with set-based deletes: at this volume the per-row
+        signals (counter refreshes, roster syncs, blob releases) would take minutes, so
+        they are disconnected and their effects applied once at the end instead.
+        Leaves go first, so each delete is a single statement.
+        """
+        courses = Course.objects.filter(name__startswith=COURSE_PREFIX)
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        with transaction.atomic(), receivers_disconnected():
+            digests = set(Submission.objects.filter(group__course__in=courses).values_list('sha256', flat=True))
+            for model in (CourseRosterRow, Contribution, Score, UploadSession, Submission, Membership, Group):
+                in_course = model in (CourseRosterRow, Group)
+                model.objects.filter(**{'course__in' if in_course else 'group__course__in': courses}).delete()
+            Course.students.through.objects.filter(course__in=courses).delete()
+            DashboardStamp.objects.filter(user_id__in=users.values('id')).delete()
+            courses.delete()
+            users.delete()
+
+            storage = submission_storage()
+            for blob in StoredBlob.objects.filter(digest__in=digests):
+                blob.ref_count = Submission.objects.filter(sha256=blob.digest).count()
+                blob.save(update_fields=['ref_count'])
+                if not blob.ref_count:
+                    transaction.on_commit(partial(delete_blob_if_orphaned, blob.digest, storage))
+        cache.clear()
+        user_cache.clear()
+
+    def create_courses(self, count):
+        now = timezone.now()
+        User.objects.create_superuser(
+            PROFESSOR_USERNAME, password=PASSWORD, role='professor', student_id='BENCHPROF', has_changed_password=True
+        )
+        Course.objects.bulk_create([
+            Course(
+                name=f'{COURSE_PREFIX} {i + 1:02d}', year=2024 + i % 3, semester=str(i % 2 + 1),
+                group_deadline=now + timedelta(days=7), proposal_deadline=now + timedelta(days=30),
+                final_deadline=now + timedelta(days=120),
+            )
+            for i in range(count)
+        ])
+        return list(Course.objects.filter(name__startswith=COURSE_PREFIX).order_by('id'))
+
+    def create_students(self, count):
+        # Hash once: every synthetic student shares the same password
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                # Usernames are student IDs, as the roster import creates them
+                username=f'{USERNAME_PREFIX}{i:06d}', student_id=f'{USERNAME_PREFIX}{i:06d}', first_name=f'Student {i}',
+                password=password, role='student', has_changed_password=True,
+            )
+            for i in range(count)
+        ], batch_size=BATCH_SIZE)
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX, role='student').order_by('id'))
+
+    def enroll(self, courses, students):
+        """Deal the students out over the courses, one course each; returns {course: [students]}."""
+        per_course = {course: students[i::len(courses)] for i, course in enumerate(courses)}
+        Enrollment = Course.students.through
+        Enrollment.objects.bulk_create([
+            Enrollment(course_id=course.id, user_id=student.id)
+            for course, enrolled in per_course.items() for student in enrolled
+        ], batch_size=BATCH_SIZE)
+        return per_course
+
+    def create_groups(self, rng, per_course, total, size):
+        groups, members = [], []
+        courses = list(per_course)
+        for i, course in enumerate(courses):
+            # Leave the remaining students of each course unassigned
+            count = total // len(courses) + (1 if i < total % len(courses) else 0)
+            pool = list(per_course[course])
+            rng.shuffle(pool)
+            for n in range(min(count, len(pool) // size)):
+                chunk = pool[n * size:(n + 1) * size]
+                groups.append(Group(
+                    course=course, name=f'Group {n + 1}', leader=chunk[0], project_name=f'Project {n + 1}',
+                    project_description='Synthetic benchmark project',
+                ))
+                members.append(chunk)
+        Group.objects.bulk_create(groups, batch_size=BATCH_SIZE)
+        # MySQL does not set primary keys on bulk-created objects: read the groups back by (course, name)
+        saved = {(g.course_id, g.name): g for g in Group.objects.filter(course__in=courses)}
+        groups = [saved[g.course_id, g.name] for g in groups]
+        Membership.objects.bulk_create([
+            # Roughly one in ten members has not confirmed yet
+            Membership(user=student, group=group, is_confirmed=(j == 0 or rng.random() > 0.1))
+            for group, chunk in zip(groups, members) for j, student in enumerate(chunk)
+        ], batch_size=BATCH_SIZE)
+        return groups
+
+    def create_submissions(self, groups, per_group):
+        if not per_group:
+            return
+        # A handful of real blobs shared by every row keeps disk usage negligible
+        storage = submission_storage()
+        names = [storage.save(f'submissions/bench{i}.pdf', ContentFile(f'%PDF-1.4 benchmark {i}'.encode())) for i in range(4)]
+        types = [choice for choice, _ in Submission.TYPE_CHOICES]
+        rows = []
+        for g, group in enumerate(groups):
+            versions = {}
+            for n in range(per_group):
+                type = types[n % len(types)]
+                versions[type] = versions.get(type, 0) + 1
+                name = names[(g + n) % len(names)]
+                rows.append(Submission(
+                    group=group, type=type, file=name, original_filename=f'{type}_v{versions[type]}.pdf',
+                    sha256=digest_from_name(name), version=versions[type],
+                ))
+        # bulk_create skips Submission.save() and the blob signals, so fill in both by hand
+        Submission.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        for name in names:
+            digest = digest_from_name(name)
+            blob, _ = StoredBlob.objects.get_or_create(digest=digest, defaults={'name': name, 'size': storage.size(name)})
+            blob.ref_count = Submission.objects.filter(sha256=digest).count()
+            blob.save(update_fields=['ref_count'])
+
+    def create_contributions_and_scores(self, rng, groups):
+        memberships = Membership.objects.filter(group__in=groups).order_by('group_id', 'id').values_list('group_id', 'user_id')
+        by_group = {}
+        for group_id, user_id in memberships.iterator(chunk_size=BATCH_SIZE):
+            by_group.setdefault(group_id, []).append(user_id)
+
+        contributions = []
+        for group_id, user_ids in by_group.items():
+            share = Decimal(100) / len(user_ids)
+            for user_id in user_ids:
+                contributions.append(Contribution(
+                    group_id=group_id, student_id=user_id, description='Implementation and report',
+                    percentage=share.quantize(Decimal('0.01')),
+                ))
+        Contribution.objects.bulk_create(contributions, batch_size=BATCH_SIZE)
+        # About two thirds of the groups are graded
+        Score.objects.bulk_create([
+            Score(group=group, team_base_score=Decimal(rng.randint(60, 100)), professor_notes='')
+            for group in groups if rng.random() < 0.66
+        ], batch_size=BATCH_SIZE)
@@ -1,28 +1,74 @@
+from functools import partial
+
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connection
 from django.utils.deprecation import MiddlewareMixin
-from django.shortcuts import get_object_or_404
-from .models import User
+from .auth_cache import get_impersonated_user, get_session_user, is_asset_path
+from .profiling import RequestProfile, current_profile, view_metrics
+
+class ProfilingMiddleware:
+    """
+    Opt-in (settings.PROFILE_REQUESTS): times each request, its SQL and its template
+    rendering, reports them in a Server-Timing header and feeds the per-view
+    histograms shown at /professor/metrics/. Put it first so the wall time covers
+    the other middleware. Streaming bodies run after it returns and are not counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if is_asset_path(request.path):
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with connection.execute_wrapper(profile.time_query):
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        profile.finish()
+        match = request.resolver_match
+        if match is not None:
+            view_metrics.record(match.view_name or match._func_path, profile)
+        response['Server-Timing'] = profile.server_timing()
+        return response
 
-class ImpersonationMiddleware(MiddlewareMixin):
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Replaces django.contrib.auth's AuthenticationMiddleware: request.user is the
+    cached session user, or the user a professor is impersonating, resolved up
+    front instead of through Django's lazy per-request query. request.auser()
+    answers the same user. Asset requests keep Django's lazy user.
+    """
     def process_request(self, request):
+        if is_asset_path(request.path):
+            return super().process_request(request)
+        user = get_session_user(request)
+        request.is_impersonating = False
         impersonate_id = request.session.get('impersonate_user_id')
-        if impersonate_id and request.user.is_authenticated and (request.user.role == 'professor' or request.user.is_staff):
-            try:
-                target_user = User.objects.get(id=impersonate_id)
-                request.original_user = request.user
-                request.user = target_user
+        if impersonate_id and user.is_authenticated and (user.role == 'professor' or user.is_staff):
+            target_user = get_impersonated_user(request, impersonate_id)
+            if target_user is not None:
+                request.original_user = user
+                user = target_user
                 request.is_impersonating = True
-            except User.DoesNotExist:
+            else:
                 del request.session['impersonate_user_id']
-        else:
-            request.is_impersonating = False
+        request.user = user
+        request.auser = partial(_auser, user)
+
+async def _auser(user):
+    return user
 
 class PasswordChangeMiddleware(MiddlewareMixin):
     def process_request(self, request):
+        if is_asset_path(request.path):
+            return None
         if request.user.is_authenticated and request.user.role == 'student':
             # Skip if professor is impersonating
             if getattr(request, 'is_impersonating', False):
                 return None
-                
+
             if not request.user.has_changed_password:
                 # Allow access to password change views and logout
                 allowed_paths = [
@@ -30,6 +76,6 @@ class PasswordChangeMiddleware(MiddlewareMixin):
                     '/accounts/password_change/done/',
                     '/accounts/logout/',
                 ]
-                if request.path not in allowed_paths and not request.path.startswith('/static/'):
+                if request.path not in allowed_paths:
                     from django.shortcuts import redirect
                     return redirect('password_change')
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:55
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Course = apps.get_model('projects', 'Course')
+    Group = apps.get_model('projects', 'Group')
+    Membership = apps.get_model('projects', 'Membership')
+    Submission = apps.get_model('projects', 'Submission')
+
+    def count(queryset, group_by):
+        return Coalesce(Subquery(queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')), 0)
+
+    groups = Group.objects.filter(course_id=OuterRef('pk'))
+    unconfirmed = Membership.objects.filter(group_id=OuterRef('pk'), is_confirmed=False)
+    Course.objects.update(
+        student_count=count(Course.students.through.objects.filter(course_id=OuterRef('pk')), 'course_id'),
+        group_count=count(groups, 'course_id'),
+        confirmed_group_count=count(groups.filter(~Exists(unconfirmed)), 'course_id'),
+        submission_count=count(Submission.objects.filter(group__course_id=OuterRef('pk')), 'group__course_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_repair_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='confirmed_group_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='group_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='submission_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+import os
+
+import projects.models
+import projects.storage
+from django.db import migrations, models
+
+
+def number_existing_versions(apps, schema_editor):
+    """Versions were never assigned; number existing uploads per group and type by upload order."""
+    Submission = apps.get_model('projects', 'Submission')
+    batch, last_key, version = [], None, 0
+    for sub in Submission.objects.order_by('group_id', 'type', 'uploaded_at', 'id').iterator(chunk_size=1000):
+        key = (sub.group_id, sub.type)
+        version = version + 1 if key == last_key else 1
+        last_key = key
+        sub.version = version
+        sub.original_filename = os.path.basename(sub.file.name)[:255]
+        batch.append(sub)
+        if len(batch) >= 1000:
+            Submission.objects.bulk_update(batch, ['version', 'original_filename'])
+            batch = []
+    if batch:
+        Submission.objects.bulk_update(batch, ['version', 'original_filename'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='file',
+            field=projects.models.SubmissionFileField(storage=projects.storage.submission_storage, upload_to='submissions/'),
+        ),
+        migrations.RunPython(number_existing_versions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('group', 'type', 'version'), name='unique_submission_version'),
+        ),
+    ]
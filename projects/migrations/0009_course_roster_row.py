@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_roster(apps, schema_editor):
+    """
+    One row per enrolled or grouped student, filled from the source tables as they
+    stand at this migration. A frozen copy of projects.roster, which may change later.
+    """
+    User, Course, Group = apps.get_model('projects', 'User'), apps.get_model('projects', 'Course'), apps.get_model('projects', 'Group')
+    Membership, Submission = apps.get_model('projects', 'Membership'), apps.get_model('projects', 'Submission')
+    Score, Contribution = apps.get_model('projects', 'Score'), apps.get_model('projects', 'Contribution')
+    CourseRosterRow = apps.get_model('projects', 'CourseRosterRow')
+    Enrollment = Course.students.through
+
+    pairs = set(Enrollment.objects.values_list('course_id', 'user_id'))
+    pairs |= set(Membership.objects.exclude(group__course_id=None).values_list('group__course_id', 'user_id'))
+    CourseRosterRow.objects.bulk_create(
+        [CourseRosterRow(course_id=c, student_id=s) for c, s in pairs], ignore_conflicts=True, batch_size=1000,
+    )
+
+    student = User.objects.filter(pk=OuterRef('student_id'))
+    membership = Membership.objects.filter(
+        user_id=OuterRef('student_id'), group__course_id=OuterRef('course_id')
+    ).order_by('id')
+    in_group = {'group__course_id': OuterRef('course_id'), 'group__membership__user_id': OuterRef('student_id')}
+    submissions = Submission.objects.filter(**in_group)
+    latest = submissions.order_by('-uploaded_at', '-id')
+    score = Score.objects.filter(**in_group)
+    contribution = Contribution.objects.filter(student_id=OuterRef('student_id'), **in_group).order_by('pk')
+
+    def first(queryset, column, default=None):
+        value = Subquery(queryset.values(column)[:1])
+        return value if default is None else Coalesce(value, Value(default))
+
+    CourseRosterRow.objects.update(
+        is_enrolled=Exists(Enrollment.objects.filter(course_id=OuterRef('course_id'), user_id=OuterRef('student_id'))),
+        student_number=first(student, 'student_id', ''),
+        student_name=first(student, 'first_name', ''),
+        group_id=first(membership, 'group_id'),
+        group_name=first(membership, 'group__name', ''),
+        project_name=first(membership, 'group__project_name', ''),
+        is_leader=Exists(Group.objects.filter(
+            leader_id=OuterRef('student_id'), course_id=OuterRef('course_id'), membership__user_id=OuterRef('student_id'),
+        )),
+        is_confirmed=first(membership, 'is_confirmed', False),
+        submission_count=Coalesce(
+            Subquery(submissions.order_by().values('group__course_id').annotate(n=Count('pk')).values('n')), 0
+        ),
+        latest_submission_type=first(latest, 'type', ''),
+        latest_submission_version=first(latest, 'version'),
+        latest_submission_at=first(latest, 'uploaded_at'),
+        team_base_score=first(score, 'team_base_score'),
+        individual_adjustments=first(score, 'individual_adjustments'),
+        contribution_percentage=first(contribution, 'percentage'),
+        contribution_description=first(contribution, 'description', ''),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_user_first_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRosterRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_enrolled', models.BooleanField(default=False)),
+                ('student_number', models.CharField(blank=True, max_length=20)),
+                ('student_name', models.CharField(blank=True, max_length=150)),
+                ('group_name', models.CharField(blank=True, max_length=100)),
+                ('project_name', models.CharField(blank=True, max_length=200)),
+                ('is_leader', models.BooleanField(default=False)),
+                ('is_confirmed', models.BooleanField(default=False)),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('latest_submission_type', models.CharField(blank=True, max_length=20)),
+                ('latest_submission_version', models.IntegerField(blank=True, null=True)),
+                ('latest_submission_at', models.DateTimeField(blank=True, null=True)),
+                ('team_base_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('individual_adjustments', models.JSONField(blank=True, null=True)),
+                ('contribution_percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('contribution_description', models.TextField(blank=True)),
+                ('course', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='roster_rows', to='projects.course')),
+                ('group', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='projects.group')),
+                ('student', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'group', 'student_number'], name='roster_course_group_idx')],
+                'constraints': [models.UniqueConstraint(fields=('course', 'student'), name='unique_course_roster_row')],
+            },
+        ),
+        migrations.RunPython(populate_roster, migrations.RunPython.noop),
+    ]
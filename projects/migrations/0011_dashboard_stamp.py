@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStamp',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:02
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount_confirmed_groups(apps, schema_editor):
+    # Groups without members no longer count as confirmed
+    Course = apps.get_model('projects', 'Course')
+    Group = apps.get_model('projects', 'Group')
+    Membership = apps.get_model('projects', 'Membership')
+    members = Membership.objects.filter(group_id=OuterRef('pk'))
+    confirmed = Group.objects.filter(
+        Exists(members), ~Exists(members.filter(is_confirmed=False)), course_id=OuterRef('pk'),
+    )
+    Course.objects.update(confirmed_group_count=Coalesce(
+        Subquery(confirmed.order_by().values('course_id').annotate(n=Count('pk')).values('n')), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0011_dashboard_stamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courserosterrow',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='courserosterrow',
+            index=models.Index(fields=['course', 'updated_at'], name='roster_course_updated_idx'),
+        ),
+        migrations.RunPython(recount_confirmed_groups, migrations.RunPython.noop),
+    ]
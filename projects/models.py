@@ -1,5 +1,11 @@
-from django.db import models
+import os
+import uuid
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.db.models.fields.files import FieldFile
+
+from .storage import digest_from_name, submission_storage
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -10,6 +16,10 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
     has_changed_password = models.BooleanField(default=False)
 
+    class Meta(AbstractUser.Meta):
+        # Name-prefix search in the group member picker (student_id is already unique, so indexed)
+        indexes = [models.Index(fields=['first_name'], name='user_first_name_idx')]
+
     def __str__(self):
         return f"{self.username} ({self.first_name})"
 
@@ -21,6 +31,15 @@ class Course(models.Model):
     group_deadline = models.DateTimeField()
     proposal_deadline = models.DateTimeField()
     final_deadline = models.DateTimeField()
+    # Denormalized counters, kept current by projects.signals (rebuild: manage.py rebuild_course_counters)
+    student_count = models.PositiveIntegerField(default=0, editable=False)
+    group_count = models.PositiveIntegerField(default=0, editable=False)
+    confirmed_group_count = models.PositiveIntegerField(default=0, editable=False)
+    submission_count = models.PositiveIntegerField(default=0, editable=False)
+    # Also bumped whenever the counters are refreshed or roster rows removed; with the
+    # newest CourseRosterRow.updated_at it is the version stamp of everything the course
+    # pages show (ETag/Last-Modified, projects.conditional)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.year}-{self.semester} {self.name}"
@@ -32,6 +51,7 @@ class Group(models.Model):
     members = models.ManyToManyField(User, through='Membership', related_name='joined_groups')
     project_name = models.CharField(max_length=200)
     project_description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -41,10 +61,29 @@ class Membership(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
     is_confirmed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'group')
 
+class SubmissionFieldFile(FieldFile):
+    def save(self, name, content, save=True):
+        # Storage names are content digests, so remember what the student called the file
+        if not self.instance.original_filename:
+            self.instance.original_filename = os.path.basename(name)[:255]
+        super().save(name, content, save)
+
+class SubmissionFileField(models.FileField):
+    attr_class = SubmissionFieldFile
+
+class SubmissionQuerySet(models.QuerySet):
+    def latest_versions(self):
+        """Only the newest upload of each type for every group."""
+        newer = Submission.objects.filter(
+            group=models.OuterRef('group'), type=models.OuterRef('type'), id__gt=models.OuterRef('id')
+        )
+        return self.filter(~models.Exists(newer))
+
 class Submission(models.Model):
     TYPE_CHOICES = (
         ('proposal_draft', 'Proposal Draft'),
@@ -52,9 +91,73 @@ class Submission(models.Model):
     )
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
-    file = models.FileField(upload_to='submissions/')
-    version = models.IntegerField(default=1)
+    file = SubmissionFileField(upload_to='submissions/', storage=submission_storage)
+    original_filename = models.CharField(max_length=255, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    version = models.IntegerField(default=1)  # assigned per group and type on first save
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SubmissionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'type', 'version'], name='unique_submission_version'),
+        ]
+
+    @property
+    def filename(self):
+        return self.original_filename or os.path.basename(self.file.name)
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            # Store the content first: the storage returns a name derived from its SHA-256
+            self.file.save(self.file.name, self.file.file, save=False)
+        if self.file:
+            self.sha256 = digest_from_name(self.file.name) or self.sha256
+        if self._state.adding:
+            with transaction.atomic():
+                # Lock the group row so concurrent uploads cannot take the same number
+                Group.objects.select_for_update().filter(pk=self.group_id).exists()
+                latest = Submission.objects.filter(group_id=self.group_id, type=self.type).aggregate(
+                    models.Max('version')
+                )['version__max']
+                self.version = (latest or 0) + 1
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
+    def previous_version(self):
+        return Submission.objects.filter(
+            group_id=self.group_id, type=self.type, version__lt=self.version
+        ).order_by('-version').first()
+
+    def is_new_content(self):
+        """Whether this upload differs from the previous version, decided from the stored digests."""
+        previous = self.previous_version()
+        return previous is None or not self.sha256 or previous.sha256 != self.sha256
+
+class StoredBlob(models.Model):
+    """One stored file content, shared by every Submission with the same SHA-256."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+class UploadSession(models.Model):
+    """
+    An upload in progress; becomes a Submission once complete. Either a resumable,
+    chunked upload, or a direct-to-storage upload waiting for its completion callback.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    type = models.CharField(max_length=20, choices=Submission.TYPE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    checksum = models.CharField(max_length=64, blank=True)  # expected SHA-256 of the whole file, optional
+    offset = models.BigIntegerField(default=0)  # bytes received and acknowledged so far
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 class Contribution(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE)
@@ -67,3 +170,61 @@ class Score(models.Model):
     team_base_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     individual_adjustments = models.JSONField(default=dict) # {student_id: adjustment}
     professor_notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class CourseRosterRow(models.Model):
+    """
+    Read model: one row per student of a course (enrolled, or in one of its groups)
+    with their group, confirmation, latest submission, score and contribution copied
+    in, so course pages read one indexed range instead of joining six tables.
+    Kept current by projects.signals via projects.roster (rebuild: manage.py rebuild_roster).
+
+    The foreign keys are unconstrained: while a course, group or user is being deleted
+    the signals of its cascading dependents re-sync rows that may still point at it,
+    and the signals remove those rows once the delete is done.
+    """
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name='roster_rows')
+    student = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    is_enrolled = models.BooleanField(default=False)
+    student_number = models.CharField(max_length=20, blank=True)  # User.student_id
+    student_name = models.CharField(max_length=150, blank=True)
+    group = models.ForeignKey(
+        Group, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    group_name = models.CharField(max_length=100, blank=True)
+    project_name = models.CharField(max_length=200, blank=True)
+    is_leader = models.BooleanField(default=False)
+    is_confirmed = models.BooleanField(default=False)
+    submission_count = models.PositiveIntegerField(default=0)  # the group's, all types and versions
+    latest_submission_type = models.CharField(max_length=20, blank=True)
+    latest_submission_version = models.IntegerField(null=True, blank=True)
+    latest_submission_at = models.DateTimeField(null=True, blank=True)
+    team_base_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # None: no Score yet
+    individual_adjustments = models.JSONField(null=True, blank=True)  # the group's whole dict
+    contribution_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    contribution_description = models.TextField(blank=True)
+    # Set by every refresh; the newest one per course is part of the course pages' version stamp
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student'], name='unique_course_roster_row'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'group', 'student_number'], name='roster_course_group_idx'),
+            models.Index(fields=['course', 'updated_at'], name='roster_course_updated_idx'),
+        ]
+
+class DashboardStamp(models.Model):
+    """
+    Version of what a student's dashboard shows, bumped by projects.caching.invalidate_dashboards.
+    Cached renders are keyed by it, so a change handled by one worker retires every
+    worker's copy, whatever the cache backend.
+
+    Unconstrained like CourseRosterRow: the signals of a user's cascading memberships
+    bump it while that user is being deleted; a User post_delete receiver removes it.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='+'
+    )
+    changed_at = models.DateTimeField()
@@ -0,0 +1,152 @@
+import base64
+import os
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+from .models import StoredBlob, Submission, UploadSession
+from .storage import submission_storage
+
+PRESIGN_SALT = 'projects.direct-upload'
+PRESIGN_EXPIRES = 60 * 60
+
+
+class DirectUploadBackend:
+    """
+    Issues presigned PUT URLs so browsers upload straight to object storage. The
+    URL carries the file's SHA-256, and the storage refuses a body that does not
+    match it, so the digest is known without the server ever reading the object.
+    """
+
+    def presign_put(self, key, content_type, size, sha256, expires=PRESIGN_EXPIRES):
+        """Return (url, headers) the browser must use to PUT the object."""
+        raise NotImplementedError
+
+    def object_matches(self, key, size, sha256):
+        """Whether the object exists with this size and checksum (metadata only, no body read)."""
+        raise NotImplementedError
+
+
+class S3DirectUpload(DirectUploadBackend):
+    """Any S3-compatible service (AWS, MinIO, R2...), configured with the AWS_* settings."""
+
+    def __init__(self):
+        import boto3  # optional dependency, only needed when this backend is enabled
+        from botocore.config import Config
+
+        self.bucket = settings.AWS_STORAGE_BUCKET_NAME
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL or None,
+            region_name=settings.AWS_S3_REGION_NAME or None,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
+            config=Config(signature_version='s3v4'),
+        )
+
+    def presign_put(self, key, content_type, size, sha256, expires=PRESIGN_EXPIRES):
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ContentType': content_type, 'ChecksumSHA256': checksum},
+            ExpiresIn=expires,
+        )
+        return url, {'Content-Type': content_type, 'x-amz-checksum-sha256': checksum}
+
+    def object_matches(self, key, size, sha256):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key, ChecksumMode='ENABLED')
+        except ClientError:
+            return False
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        return head['ContentLength'] == size and head.get('ChecksumSHA256') == checksum
+
+
+class LocalDirectUpload(DirectUploadBackend):
+    """
+    MinIO-style stand-in for development and tests: the "bucket" is the submissions
+    storage, and the presigned URL points at local_bucket_put, which checks the
+    signature, expiry and checksum the way S3 would.
+    """
+
+    def presign_put(self, key, content_type, size, sha256, expires=PRESIGN_EXPIRES):
+        signature = signing.dumps({'key': key, 'size': size, 'sha256': sha256}, salt=PRESIGN_SALT + '.local')
+        return f"{reverse('local_bucket_put')}?signature={signature}", {'Content-Type': content_type}
+
+    def object_matches(self, key, size, sha256):
+        # local_bucket_put only stores bodies matching the signed checksum
+        storage = submission_storage()
+        return storage.exists(key) and storage.size(key) == size
+
+    @staticmethod
+    def verify(signature):
+        """Return (key, size, sha256) for a valid, unexpired signature; raises signing.BadSignature."""
+        payload = signing.loads(signature, salt=PRESIGN_SALT + '.local', max_age=PRESIGN_EXPIRES)
+        return payload['key'], payload['size'], payload['sha256']
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_direct_upload_backend():
+    """The configured backend, or None when direct uploads are disabled."""
+    path = getattr(settings, 'DIRECT_UPLOAD_BACKEND', '')
+    return _load_backend(path) if path else None
+
+
+def new_object_key(filename):
+    return f"submissions/incoming/{uuid.uuid4().hex}/{get_valid_filename(os.path.basename(filename))}"
+
+
+def sign_ticket(user, group, type, key, filename, size, sha256):
+    """
+    Everything the completion callback needs, signed so the client cannot alter it.
+
+    The ticket is bound to an UploadSession row, which completing the upload deletes,
+    so each ticket records at most one Submission.
+    """
+    upload = UploadSession.objects.create(user=user, group=group, type=type, filename=filename, size=size)
+    return signing.dumps(
+        {'user': user.id, 'group': group.id, 'type': type, 'key': key, 'filename': filename, 'size': size,
+         'sha256': sha256, 'upload': str(upload.id)},
+        salt=PRESIGN_SALT,
+    )
+
+
+def read_ticket(ticket):
+    return signing.loads(ticket, salt=PRESIGN_SALT, max_age=PRESIGN_EXPIRES * 2)
+
+
+def claim_ticket(ticket):
+    """Use up the ticket's upload row; False when the ticket was already used."""
+    deleted, _ = UploadSession.objects.filter(id=ticket['upload'], user_id=ticket['user']).delete()
+    return bool(deleted)
+
+
+def adopt_object(group, ticket):
+    """
+    Record the uploaded object as a Submission without reading it: the storage
+    verified the ticket's SHA-256 on upload. If that content is already stored the
+    Submission shares it and the new copy is removed once committed; otherwise the
+    object stays under its upload key and becomes the stored blob.
+    """
+    submission = Submission(
+        group=group, type=ticket['type'], original_filename=ticket['filename'], sha256=ticket['sha256'],
+    )
+    existing = StoredBlob.objects.filter(digest=ticket['sha256']).values_list('name', flat=True).first()
+    submission.file.name = existing or ticket['key']
+    submission.save()
+    if existing:
+        storage = submission_storage()
+        transaction.on_commit(lambda: storage.delete(ticket['key']))
+    return submission
@@ -0,0 +1,50 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+# Below this many passwords the cost of starting worker processes outweighs the gain
+MIN_PARALLEL_BATCH = 8
+
+
+def default_workers():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked (macOS, Windows)
+    if not settings.configured:
+        django.setup()
+
+
+def hash_passwords(raw_passwords, workers=None):
+    """
+    Hash `raw_passwords` with make_password, spread across a process pool.
+
+    Returns the encoded hashes in input order. Each hash is a full run of the
+    configured hasher (PBKDF2 by default), so this is CPU-bound and scales with cores.
+    """
+    raw_passwords = list(raw_passwords)
+    workers = min(workers or default_workers(), len(raw_passwords))
+    if workers <= 1 or len(raw_passwords) < MIN_PARALLEL_BATCH:
+        return [make_password(p) for p in raw_passwords]
+
+    chunksize = math.ceil(len(raw_passwords) / (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, raw_passwords, chunksize=chunksize))
+
+
+def set_default_passwords(users, workers=None):
+    """
+    Set each user's password to the last 4 digits of their student ID, in memory.
+
+    Callers persist the result, e.g. with User.objects.bulk_update(users, ['password', ...]).
+    """
+    users = list(users)
+    hashes = hash_passwords([u.student_id[-4:] for u in users], workers=workers)
+    for user, encoded in zip(users, hashes):
+        user.password = encoded
+    return users
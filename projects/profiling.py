@@ -0,0 +1,204 @@
+"""
+Lightweight per-view profiling: wall time, SQL and template timings per request.
+
+ProfilingMiddleware (projects.middleware) creates a RequestProfile for every
+request, counts queries through a connection execute_wrapper and template time
+through ProfiledDjangoTemplates, then adds the totals to `view_metrics`. The
+metrics are in-process only: each worker keeps its own fixed-bucket histograms
+over a rolling window, so recording costs a few dict updates and no I/O.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates, Template
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+WINDOW_SECONDS = 300
+SQL_SAMPLE_LENGTH = 300
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.wall = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._statements = Counter()
+
+    def time_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            # Same SQL with different parameters, repeated: the N+1 signature
+            self._statements[sql] += 1
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.start
+
+    def worst_repeat(self):
+        """(count, sql) of the most repeated statement in this request."""
+        if not self._statements:
+            return 0, ''
+        sql, count = self._statements.most_common(1)[0]
+        return count, sql
+
+    def server_timing(self):
+        return (
+            f'app;dur={self.wall * 1000:.1f}, '
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}'
+        )
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.histogram = [0] * len(BUCKETS_MS)
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.total_queries = 0
+        self.max_queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.worst_repeat = 0
+        self.worst_repeat_sql = ''
+
+    def add(self, profile):
+        self.requests += 1
+        self.histogram[bisect.bisect_left(BUCKETS_MS, profile.wall * 1000)] += 1
+        self.total_time += profile.wall
+        self.max_time = max(self.max_time, profile.wall)
+        self.total_queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.sql_time += profile.sql_time
+        self.template_time += profile.template_time
+        repeat, sql = profile.worst_repeat()
+        if repeat > self.worst_repeat:
+            self.worst_repeat, self.worst_repeat_sql = repeat, sql[:SQL_SAMPLE_LENGTH]
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.total_queries += other.total_queries
+        self.max_queries = max(self.max_queries, other.max_queries)
+        self.sql_time += other.sql_time
+        self.template_time += other.template_time
+        if other.worst_repeat > self.worst_repeat:
+            self.worst_repeat, self.worst_repeat_sql = other.worst_repeat, other.worst_repeat_sql
+
+    def percentile_ms(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile."""
+        threshold = pct / 100 * self.requests
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.histogram):
+            seen += count
+            if count and seen >= threshold:
+                return bound if bound != float('inf') else self.max_time * 1000
+        return 0
+
+    def summary(self, view):
+        per_request = 1000 / self.requests if self.requests else 0
+        return {
+            'view': view,
+            'requests': self.requests,
+            'p50_ms': self.percentile_ms(50),
+            'p95_ms': self.percentile_ms(95),
+            'max_ms': self.max_time * 1000,
+            'avg_ms': self.total_time * per_request,
+            'avg_queries': self.total_queries / self.requests if self.requests else 0,
+            'max_queries': self.max_queries,
+            'sql_ms': self.sql_time * per_request,
+            'template_ms': self.template_time * per_request,
+            'worst_repeat': self.worst_repeat,
+            'worst_repeat_sql': self.worst_repeat_sql,
+        }
+
+
+class ViewMetrics:
+    """
+    Thread-safe per-view statistics over a rolling window: requests land in the
+    current window, and a snapshot merges it with the previous one, so it always
+    covers between one and two WINDOW_SECONDS of traffic.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._current, self._previous = {}, {}
+            self._window_start = time.monotonic()
+
+    def _rotate(self, now):
+        if now - self._window_start >= self.window:
+            # A window with no traffic at all leaves nothing worth keeping
+            self._previous = self._current if now - self._window_start < 2 * self.window else {}
+            self._current = {}
+            self._window_start = now
+
+    def record(self, view, profile):
+        with self._lock:
+            self._rotate(time.monotonic())
+            stats = self._current.get(view)
+            if stats is None:
+                stats = self._current[view] = ViewStats()
+            stats.add(profile)
+
+    def snapshot(self):
+        """{view name: ViewStats} merged over the current and previous window."""
+        with self._lock:
+            self._rotate(time.monotonic())
+            merged = {}
+            for window in (self._previous, self._current):
+                for view, stats in window.items():
+                    merged.setdefault(view, ViewStats()).merge(stats)
+        return merged
+
+
+view_metrics = ViewMetrics()
+
+
+def report(metrics=view_metrics, limit=20):
+    """(slowest views by p95, views repeating the same statement most) for the metrics page."""
+    rows = [stats.summary(view) for view, stats in metrics.snapshot().items()]
+    slowest = sorted(rows, key=lambda r: (r['p95_ms'], r['avg_ms']), reverse=True)[:limit]
+    offenders = sorted((r for r in rows if r['worst_repeat'] > 1), key=lambda r: r['worst_repeat'], reverse=True)
+    return slowest, offenders[:limit]
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose top-level renders are timed (includes count towards their parent)."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return ProfiledTemplate(template.template, self)
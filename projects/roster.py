@@ -0,0 +1,159 @@
+"""
+Maintenance and reads for CourseRosterRow, the per-course roster read model.
+
+Which (course, student) rows exist follows enrollments and memberships
+(sync_roster); what a row says is recomputed from the source tables by a
+single UPDATE with correlated subqueries (refresh_roster_rows), the same way
+projects.counters keeps Course counters, so racing writers cannot leave a row
+drifting. Signals call these for just the students or group that changed;
+bulk paths call them by hand. They also keep the course pages' version stamp
+current: refreshed rows get a new updated_at, and removing rows bumps
+Course.updated_at.
+"""
+from dataclasses import dataclass, field
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .counters import touch_courses
+from .models import Contribution, Course, CourseRosterRow, Group, Membership, Score, Submission, User
+
+
+def roster_expressions():
+    """Column -> expression recomputing it from the source tables, for CourseRosterRow.objects.update()."""
+    Enrollment = Course.students.through
+
+    student = User.objects.filter(pk=OuterRef('student_id'))
+    membership = Membership.objects.filter(
+        user_id=OuterRef('student_id'), group__course_id=OuterRef('course_id')
+    ).order_by('id')
+    # "The student's group" below means a group of this course they are a member of
+    in_group = {'group__course_id': OuterRef('course_id'), 'group__membership__user_id': OuterRef('student_id')}
+    submissions = Submission.objects.filter(**in_group)
+    latest = submissions.order_by('-uploaded_at', '-id')
+    score = Score.objects.filter(**in_group)
+    contribution = Contribution.objects.filter(student_id=OuterRef('student_id'), **in_group).order_by('pk')
+
+    def first(queryset, column, default=None):
+        value = Subquery(queryset.values(column)[:1])
+        return value if default is None else Coalesce(value, Value(default))
+
+    return {
+        'is_enrolled': Exists(Enrollment.objects.filter(course_id=OuterRef('course_id'), user_id=OuterRef('student_id'))),
+        'student_number': first(student, 'student_id', ''),
+        'student_name': first(student, 'first_name', ''),
+        'group_id': first(membership, 'group_id'),
+        'group_name': first(membership, 'group__name', ''),
+        'project_name': first(membership, 'group__project_name', ''),
+        'is_leader': Exists(Group.objects.filter(
+            leader_id=OuterRef('student_id'), course_id=OuterRef('course_id'), membership__user_id=OuterRef('student_id'),
+        )),
+        'is_confirmed': first(membership, 'is_confirmed', False),
+        'submission_count': Coalesce(
+            Subquery(submissions.order_by().values('group__course_id').annotate(n=Count('pk')).values('n')), 0
+        ),
+        'latest_submission_type': first(latest, 'type', ''),
+        'latest_submission_version': first(latest, 'version'),
+        'latest_submission_at': first(latest, 'uploaded_at'),
+        'team_base_score': first(score, 'team_base_score'),
+        'individual_adjustments': first(score, 'individual_adjustments'),
+        'contribution_percentage': first(contribution, 'percentage'),
+        'contribution_description': first(contribution, 'description', ''),
+    }
+
+
+def refresh_roster_rows(rows):
+    """
+    Recompute every column of the CourseRosterRow queryset `rows` in one UPDATE.
+    Only the refreshed rows are written, not the Course row, so changes to
+    different students of a course do not wait on each other.
+    """
+    return rows.update(updated_at=timezone.now(), **roster_expressions())
+
+
+def sync_roster(course_ids=None, student_ids=None):
+    """
+    Make the rows for the given courses and students (everything if both are None)
+    match enrollments and memberships, then refresh them. Scoped to a student or a
+    group, as the signals use it, this is a handful of small indexed queries.
+    """
+    Enrollment = Course.students.through
+    if course_ids is not None:
+        course_ids = {c for c in course_ids if c is not None}
+        if not course_ids:
+            return 0
+    if student_ids is not None:
+        student_ids = set(student_ids)
+        if not student_ids:
+            return 0
+
+    enrollments, memberships = Enrollment.objects.all(), Membership.objects.exclude(group__course_id=None)
+    rows = CourseRosterRow.objects.all()
+    if course_ids is not None:
+        enrollments = enrollments.filter(course_id__in=course_ids)
+        memberships = memberships.filter(group__course_id__in=course_ids)
+        rows = rows.filter(course_id__in=course_ids)
+    if student_ids is not None:
+        enrollments = enrollments.filter(user_id__in=student_ids)
+        memberships = memberships.filter(user_id__in=student_ids)
+        rows = rows.filter(student_id__in=student_ids)
+
+    with transaction.atomic():
+        wanted = set(enrollments.values_list('course_id', 'user_id'))
+        wanted |= set(memberships.values_list('group__course_id', 'user_id'))
+        existing = set(rows.values_list('course_id', 'student_id'))
+        stale = existing - wanted
+        for course_id, students in groupby(sorted(stale), key=lambda pair: pair[0]):
+            rows.filter(course_id=course_id, student_id__in=[s for _, s in students]).delete()
+        if stale:
+            # Rows that are gone are not among those refreshed below
+            touch_courses({course_id for course_id, _ in stale})
+        CourseRosterRow.objects.bulk_create(
+            [CourseRosterRow(course_id=c, student_id=s) for c, s in wanted - existing],
+            ignore_conflicts=True, batch_size=1000,
+        )
+        return refresh_roster_rows(rows)
+
+
+@dataclass
+class RosterGroup:
+    """A group as course pages show it, put together from its members' roster rows."""
+    id: int
+    name: str
+    project_name: str
+    submission_count: int
+    team_base_score: object  # None until the group has a Score
+    members: list = field(default_factory=list)
+
+
+def roster_groups(rows, empty=()):
+    """
+    RosterGroups, in group order, from roster rows ordered by group. Groups without
+    members have no rows; pass their empty_groups() values as `empty` to list them too.
+    """
+    groups = [RosterGroup(**values) for values in empty]
+    for group_id, members in groupby((r for r in rows if r.group_id is not None), key=lambda r: r.group_id):
+        members = list(members)
+        head = members[0]
+        groups.append(RosterGroup(
+            group_id, head.group_name, head.project_name, head.submission_count, head.team_base_score, members,
+        ))
+    return sorted(groups, key=lambda group: group.id)
+
+
+def empty_groups(course, group_ids=None):
+    """RosterGroup values of the groups of `course` (or just `group_ids`) that have no members."""
+    groups = Group.objects.filter(course=course).exclude(Exists(Membership.objects.filter(group_id=OuterRef('pk'))))
+    if group_ids is not None:
+        groups = groups.filter(id__in=group_ids)
+    return groups.annotate(
+        submission_count=Count('submission'), team_base_score=F('score__team_base_score'),
+    ).values('id', 'name', 'project_name', 'submission_count', 'team_base_score')
+
+
+def course_roster(course):
+    """Every roster row of `course`, grouped students first by group, in one indexed range scan."""
+    return CourseRosterRow.objects.filter(course=course).order_by('group_id', 'student_number')
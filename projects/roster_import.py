@@ -0,0 +1,125 @@
+import csv
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .auth_cache import user_cache
+from .caching import invalidate_groupmate_dashboards
+from .counters import refresh_course_counters
+from .roster import sync_roster
+from .models import User, Course
+from .passwords import set_default_passwords
+
+ID_HEADERS = ('student_id', '學號', '学号')
+NAME_HEADERS = ('name', '姓名')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def detect_columns(first_row):
+    """Return (id_idx, name_idx, has_header) for the first CSV row."""
+    header = [str(c).strip().lower() for c in first_row]
+    if not any(h in header for h in ID_HEADERS):
+        # No header, assume column 0 is ID, column 1 is Name
+        return 0, 1, False
+    id_idx = next(header.index(h) for h in ID_HEADERS if h in header)
+    name_idx = next((header.index(h) for h in NAME_HEADERS if h in header), 1)
+    return id_idx, name_idx, True
+
+
+def import_roster(course, lines, batch_size=1000):
+    """
+    Stream a roster CSV (any iterable of text lines) into `course`.
+
+    Rows are handled in batches: one query matches existing users, new users are
+    inserted with bulk_create, existing ones refreshed with bulk_update, and the
+    enrollments go into the Course.students through table in one bulk insert.
+    Passwords are (re)set to the last 4 digits of the student ID for new users and
+    for users who have not changed their password yet, hashed in parallel per batch.
+    """
+    result = ImportResult()
+    reader = csv.reader(lines)
+    first_row = next(reader, None)
+    if first_row is None:
+        return result
+
+    id_idx, name_idx, has_header = detect_columns(first_row)
+    batch = {}
+    rows = reader if has_header else _chain_first(first_row, reader)
+    for row in rows:
+        if len(row) <= max(id_idx, name_idx):
+            result.skipped += 1
+            continue
+        student_id = row[id_idx].strip()
+        name = row[name_idx].strip()
+        if not (student_id and name):
+            result.skipped += 1
+            continue
+        if student_id in batch:
+            # Later rows win for duplicate IDs within a batch
+            result.skipped += 1
+        batch[student_id] = name
+        if len(batch) >= batch_size:
+            _import_batch(course, batch, result)
+            batch = {}
+    if batch:
+        _import_batch(course, batch, result)
+    return result
+
+
+def _chain_first(first_row, reader):
+    yield first_row
+    yield from reader
+
+
+def _import_batch(course, batch, result):
+    with transaction.atomic():
+        existing = {u.username: u for u in User.objects.filter(username__in=batch.keys())}
+
+        to_create, to_update, needs_password = [], [], []
+        for student_id, name in batch.items():
+            user = existing.get(student_id)
+            if user is None:
+                user = User(username=student_id, student_id=student_id, first_name=name, role='student')
+                to_create.append(user)
+                needs_password.append(user)
+            else:
+                user.student_id = student_id
+                user.first_name = name
+                user.role = 'student'
+                to_update.append(user)
+                if not user.has_changed_password:
+                    needs_password.append(user)
+        set_default_passwords(needs_password)
+
+        User.objects.bulk_create(to_create, batch_size=500)
+        User.objects.bulk_update(to_update, ['student_id', 'first_name', 'role', 'password'], batch_size=500)
+
+        # bulk_create does not return primary keys on every backend, so look the IDs up again
+        user_ids = list(User.objects.filter(username__in=batch.keys()).values_list('id', flat=True))
+        Enrollment = Course.students.through
+        Enrollment.objects.bulk_create(
+            [Enrollment(course_id=course.id, user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+            batch_size=500,
+        )
+        # Bulk inserts skip signals, so update the counters, the roster and the cached dashboards ourselves
+        refresh_course_counters([course.id], fields=['student_count'])
+        # Every course of a renamed student shows the new name, and so does every groupmate's card
+        sync_roster(student_ids=user_ids)
+        invalidate_groupmate_dashboards(user_ids)
+        # Renamed or re-passworded users are still cached by the auth middleware; until the
+        # import commits, the cached rows are the current ones
+        transaction.on_commit(lambda user_ids=user_ids: user_cache.invalidate_users(user_ids))
+
+    result.created += len(to_create)
+    result.updated += len(to_update)
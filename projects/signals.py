@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from .auth_cache import user_cache
+from .caching import invalidate_dashboards, invalidate_groupmate_dashboards
+from .counters import refresh_course_counters, touch_courses
+from . import live
+from .models import Contribution, Course, CourseRosterRow, DashboardStamp, Group, Membership, Score, StoredBlob, Submission, User
+from .roster import refresh_roster_rows, sync_roster
+
+# Every (signal, handler, sender) connected below, so that bulk maintenance can switch them off
+_connected = []
+
+
+def receiver(signal, sender):
+    """django.dispatch.receiver, remembering the connection for receivers_disconnected()."""
+    signals = signal if isinstance(signal, list) else [signal]
+
+    def decorator(func):
+        for each in signals:
+            each.connect(func, sender=sender)
+            _connected.append((each, func, sender))
+        return func
+    return decorator
+
+
+@contextmanager
+def receivers_disconnected():
+    """
+    Disconnect this module's handlers, for management commands that apply their effects
+    themselves. With no listeners, QuerySet.delete() also takes Django's fast-delete path.
+    Affects the whole process, so never use it while serving requests.
+    """
+    for signal, func, sender in _connected:
+        signal.disconnect(func, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, func, sender in _connected:
+            signal.connect(func, sender=sender)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login alone; cards show only the name and student ID
+    if created or (update_fields is not None and not {'first_name', 'student_id'} & set(update_fields)):
+        return
+    invalidate_groupmate_dashboards([instance.pk])
+
+
+@receiver(post_delete, sender=User)
+def delete_dashboard_stamp(sender, instance, **kwargs):
+    DashboardStamp.objects.filter(user_id=instance.pk).delete()
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    # Every member's card lists the whole group with confirmation states
+    member_ids = set(Membership.objects.filter(group_id=instance.group_id).values_list('user_id', flat=True))
+    invalidate_dashboards(member_ids | {instance.user_id})
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_dashboards(Membership.objects.filter(group_id=instance.pk).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_dashboards(Course.students.through.objects.filter(course_id=instance.pk).values_list('user_id', flat=True))
+    invalidate_dashboards(Membership.objects.filter(group__course_id=instance.pk).values_list('user_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.enrolled_courses.add(...)
+        invalidate_dashboards([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_dashboards(instance.students.values_list('id', flat=True))
+    else:
+        invalidate_dashboards(pk_set or ())
+
+
+def _course_of_group(group_id):
+    return Group.objects.filter(pk=group_id).values_list('course_id', flat=True).first()
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def enrollment_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # user.enrolled_courses.clear(): remember the courses before the rows are gone
+        instance._cleared_course_ids = list(instance.enrolled_courses.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            refresh_course_counters([instance.pk], fields=['student_count'])
+        elif action == 'post_clear':
+            refresh_course_counters(getattr(instance, '_cleared_course_ids', []), fields=['student_count'])
+        else:
+            refresh_course_counters(pk_set or (), fields=['student_count'])
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_courses(sender, instance, **kwargs):
+    # Enrollment rows are removed by cascade, which sends no m2m_changed
+    instance._enrolled_course_ids = list(instance.enrolled_courses.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted_counters(sender, instance, **kwargs):
+    refresh_course_counters(getattr(instance, '_enrolled_course_ids', []), fields=['student_count'])
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_counters(sender, instance, created=False, **kwargs):
+    if created or kwargs['signal'] is post_delete:
+        refresh_course_counters([instance.course_id], fields=['group_count', 'confirmed_group_count', 'submission_count'])
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def membership_counters(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_confirmed' not in update_fields:
+        return
+    # A group's confirmed state can only flip when every other member is confirmed, so
+    # most invitations and confirmations leave the Course row (and its lock) alone
+    others_pending = Membership.objects.filter(group_id=instance.group_id, is_confirmed=False).exclude(pk=instance.pk)
+    if not others_pending.exists():
+        refresh_course_counters([_course_of_group(instance.group_id)], fields=['confirmed_group_count'])
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def submission_counters(sender, instance, created=False, **kwargs):
+    if created or kwargs['signal'] is post_delete:
+        refresh_course_counters([_course_of_group(instance.group_id)], fields=['submission_count'])
+
+
+def delete_blob_if_orphaned(digest, storage):
+    """
+    Delete a blob whose last reference is gone, bytes included. Runs after the
+    releasing transaction commits and checks the count again under a row lock, so a
+    blob that an upload has picked up again in the meantime is kept.
+    """
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(digest=digest, ref_count__lte=0).first()
+        if blob is not None:
+            blob.delete()
+            storage.delete(blob.name)
+
+
+def _retain_blob(instance):
+    StoredBlob.objects.get_or_create(
+        digest=instance.sha256,
+        defaults={'name': instance.file.name, 'size': instance.file.storage.size(instance.file.name)},
+    )
+    StoredBlob.objects.filter(digest=instance.sha256).update(ref_count=F('ref_count') + 1)
+
+
+def _release_blob(digest, storage):
+    StoredBlob.objects.filter(digest=digest, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(partial(delete_blob_if_orphaned, digest, storage))
+
+
+@receiver(pre_save, sender=Submission)
+def remember_blob(sender, instance, raw=False, **kwargs):
+    # The digest stored before this save, so post_save can move the reference when the file changes
+    instance._stored_sha256 = None
+    if instance.pk and not instance._state.adding and not raw:
+        instance._stored_sha256 = Submission.objects.filter(pk=instance.pk).values_list('sha256', flat=True).first()
+
+
+@receiver(post_save, sender=Submission)
+def reference_blob(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_stored_sha256', None)
+    if previous == instance.sha256:
+        return
+    if instance.sha256:
+        _retain_blob(instance)
+    if previous:
+        _release_blob(previous, instance.file.storage)
+
+
+@receiver(post_delete, sender=Submission)
+def release_blob(sender, instance, **kwargs):
+    if instance.sha256:
+        _release_blob(instance.sha256, instance.file.storage)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def publish_membership(sender, instance, **kwargs):
+    live.publish(_course_of_group(instance.group_id), instance.group_id, 'membership')
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def publish_submission(sender, instance, created=False, **kwargs):
+    if created or kwargs['signal'] is post_delete:
+        live.publish(_course_of_group(instance.group_id), instance.group_id, 'submission')
+
+
+@receiver(post_save, sender=Score)
+def publish_score(sender, instance, **kwargs):
+    live.publish(_course_of_group(instance.group_id), instance.group_id, 'score')
+
+
+# Course roster read model (projects.roster): re-sync only the students or group that changed
+
+@receiver(post_save, sender=User)
+def roster_user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins save last_login alone; only the name and student ID are copied into rows
+    if created or (update_fields is not None and not {'first_name', 'student_id'} & set(update_fields)):
+        return
+    refresh_roster_rows(CourseRosterRow.objects.filter(student_id=instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def roster_user_deleted(sender, instance, **kwargs):
+    CourseRosterRow.objects.filter(student_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Course)
+def roster_course_deleted(sender, instance, **kwargs):
+    CourseRosterRow.objects.filter(course_id=instance.pk).delete()
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def roster_enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # pk_set is None after clear(), which widens the sync to everything the instance had
+    if reverse:
+        sync_roster(course_ids=pk_set, student_ids=[instance.pk])
+    else:
+        sync_roster(course_ids=[instance.pk], student_ids=pk_set)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def roster_membership_changed(sender, instance, **kwargs):
+    sync_roster([_course_of_group(instance.group_id)], [instance.user_id])
+
+
+@receiver(post_save, sender=Group)
+def roster_group_changed(sender, instance, created=False, **kwargs):
+    if created:
+        # No members yet; the leader's Membership syncs its row
+        return
+    # Name, project, leader or even course may have changed
+    if not sync_roster(student_ids=Membership.objects.filter(group_id=instance.pk).values_list('user_id', flat=True)):
+        # No rows to stamp: a group without members is listed straight from the Group table
+        touch_courses([instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=Submission)
+@receiver([post_save, post_delete], sender=Score)
+def roster_group_data_changed(sender, instance, **kwargs):
+    if not refresh_roster_rows(CourseRosterRow.objects.filter(group_id=instance.group_id)):
+        touch_courses(Group.objects.filter(pk=instance.group_id).values('course_id'))
+
+
+@receiver([post_save, post_delete], sender=Contribution)
+def roster_contribution_changed(sender, instance, **kwargs):
+    refresh_roster_rows(CourseRosterRow.objects.filter(group_id=instance.group_id, student_id=instance.student_id))
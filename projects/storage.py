@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+
+DIGEST_RE = re.compile(r'(?:^|/)([0-9a-f]{64})$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that keeps each distinct content exactly once.
+
+    Uploads are hashed with SHA-256 while being streamed to a temporary file and
+    then stored as ``<upload_to>/<digest[:2]>/<digest>``; if that blob already exists
+    the copy is discarded and the existing name is returned. The name carries no
+    extension, so equal bytes uploaded as ``a.pdf`` and ``a.PDF`` share one blob; the
+    student's file name lives on Submission.original_filename. Reference counts live
+    in StoredBlob (see projects.signals), which deletes a blob with its last user.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content, chosen in _save()
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.dirname(name)
+        tmp_dir = self.path(os.path.join(directory, 'tmp'))
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            hexdigest = digest.hexdigest()
+            blob_name = f'{directory}/{hexdigest[:2]}/{hexdigest}'.lstrip('/')
+            full_path = self.path(blob_name)
+            if os.path.exists(full_path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                # Atomic, so concurrent uploads of the same content are harmless
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return blob_name
+
+
+def digest_from_name(name):
+    """SHA-256 encoded in a content-addressed file name, or '' for other names."""
+    match = DIGEST_RE.search(name or '')
+    return match.group(1) if match else ''
+
+
+def submission_storage():
+    return storages['submissions']
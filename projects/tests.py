@@ -1,3 +1,1658 @@
-from django.test import TestCase
+import csv
+import hashlib
+import importlib
+import io
+import re
+import sys
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, iscoroutinefunction
+
+from django.contrib.auth.hashers import check_password
+from django.contrib.sessions.models import Session
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from .models import (
+    User, Course, CourseRosterRow, DashboardStamp, Group, Membership, Submission, Contribution, Score, StoredBlob,
+    UploadSession,
+)
+from .auth_cache import user_cache
+from .benchmarks import build_scenarios, load_budgets, run_benchmarks
+from .forms import eligible_students
+from .management.commands import repair_data
+from .grade_engine import GradePolicy, course_grades, final_grades, group_grades
+from . import chunked_upload, live, object_storage
+from .profiling import RequestProfile, report, view_metrics
+from .passwords import hash_passwords
+from .roster import RosterGroup, sync_roster
+from .roster_import import import_roster
+from .storage import ContentAddressedStorage
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+# Admin pages reference static files; skip the collectstatic manifest in tests
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def make_course(**kwargs):
+    now = timezone.now()
+    defaults = {
+        'name': 'Programming Languages',
+        'group_deadline': now + timedelta(days=7),
+        'proposal_deadline': now + timedelta(days=14),
+        'final_deadline': now + timedelta(days=60),
+    }
+    defaults.update(kwargs)
+    return Course.objects.create(**defaults)
+
+
+def make_students(count, prefix='S'):
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}{i:05d}', student_id=f'{prefix}{i:05d}', first_name=f'Student {i}', role='student',
+             has_changed_password=True)
+        for i in range(count)
+    ])
+    return list(User.objects.filter(username__in=[u.username for u in users]).order_by('id'))
+
+
+def seed_groups(course, students, group_size=3):
+    """Split `students` into groups of `group_size`, led by the first member of each."""
+    groups = []
+    for i in range(0, len(students), group_size):
+        chunk = students[i:i + group_size]
+        groups.append(Group(course=course, name=f'Group {i // group_size + 1}', leader=chunk[0], project_name='Project'))
+    Group.objects.bulk_create(groups)
+    groups = list(Group.objects.filter(course=course).order_by('id'))
+
+    memberships = []
+    for group, i in zip(groups, range(0, len(students), group_size)):
+        for j, student in enumerate(students[i:i + group_size]):
+            memberships.append(Membership(user=student, group=group, is_confirmed=(j == 0)))
+    Membership.objects.bulk_create(memberships)
+    # bulk_create sends no signals, so bring the roster read model up to date by hand
+    sync_roster([course.id])
+    return groups
+
+
+class CourseDetailQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        students = make_students(650)
+        cls.course.students.add(*students)
+        # 210 groups of 3, leaving 20 students unassigned
+        cls.groups = seed_groups(cls.course, students[:630])
+        Submission.objects.bulk_create([
+            Submission(group=g, type='proposal_draft', file='submissions/p.pdf') for g in cls.groups[::2]
+        ])
+        Score.objects.bulk_create([Score(group=g, team_base_score=80) for g in cls.groups[::3]])
+        sync_roster([cls.course.id])
+
+    def setUp(self):
+        self.client.force_login(self.professor)
+
+    def test_query_count_is_constant(self):
+        url = reverse('course_detail', args=[self.course.id])
+        # session, user, version stamp (projects.conditional), course, one scan of the course's roster
+        # rows, then the groups without members (which have no rows)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['groups']), 210)
+        self.assertEqual(len(response.context['unassigned_students']), 20)
+        self.assertContains(response, '註冊學生: 650 位')
+        self.assertContains(response, '尚未加入小組的學生 (20 位)')
+
+    def test_groups_without_members_are_listed(self):
+        url = reverse('course_detail', args=[self.course.id])
+        empty = Group.objects.create(course=self.course, name='Empty', leader=self.professor, project_name='TBD')
+        Score.objects.create(group=empty, team_base_score=60)
+        response = self.client.get(url)
+        groups = response.context['groups']
+        self.assertEqual(len(groups), 211)
+        self.assertEqual(groups[-1], RosterGroup(empty.id, 'Empty', 'TBD', 0, 60))
+        self.assertContains(response, f'id="group-row-{empty.id}"')
+
+        # It has no roster rows, yet changes to it still reach the page
+        empty.name = 'Renamed'
+        empty.save()
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertContains(response, 'Renamed')
+
+    def test_row_values(self):
+        response = self.client.get(reverse('course_detail', args=[self.course.id]))
+        groups = {g.id: g for g in response.context['groups']}
+        first, second = groups[self.groups[0].id], groups[self.groups[1].id]
+        self.assertEqual(first.submission_count, 1)
+        self.assertEqual(second.submission_count, 0)
+        self.assertEqual(first.team_base_score, 80)
+        self.assertIsNone(second.team_base_score)
+        self.assertEqual(len(first.members), 3)
+        self.assertEqual([m.is_leader for m in first.members], [True, False, False])
+
+
+class ExportGradesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        students = make_students(60)
+        cls.course.students.add(*students)
+        cls.groups = seed_groups(cls.course, students)
+        cls.students = students
+        Score.objects.create(group=cls.groups[0], team_base_score=Decimal('88.50'))
+        Contribution.objects.create(group=cls.groups[0], student=students[0], description='後端', percentage=Decimal('40.00'))
+
+        other = make_course(name='Compilers')
+        other_students = make_students(9, prefix='T')
+        seed_groups(other, other_students)
+
+    def setUp(self):
+        self.client.force_login(self.professor)
+
+    def read_rows(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(content.lstrip('﻿'))))
+
+    def test_course_export_streams_in_one_query(self):
+        url = reverse('export_grades_csv') + f'?course_id={self.course.id}'
+        # session, user, course, then a single query for every row
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+            rows = self.read_rows(response)
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(rows), 61)
+        # 40% of a three-person group is 1.2 equal shares, which earns the full weighted bonus
+        self.assertEqual(rows[1], [self.students[0].student_id, 'Student 0', 'Group 1', 'Project', '88.50', '40.00%', '後端', '', '97.35'])
+        self.assertEqual(rows[2][4:], ['88.50', '未填寫', '', '', '88.50'])
+        self.assertEqual(rows[4][4:], ['未評分', '未填寫', '', '', '未評分'])
+
+    def test_all_courses_export(self):
+        with self.assertNumQueries(3):
+            rows = self.read_rows(self.client.get(reverse('export_grades_csv')))
+        self.assertEqual(len(rows), 70)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, STORAGES=PLAIN_STORAGES)
+class RosterImportTests(TestCase):
+    def setUp(self):
+        self.course = make_course()
+
+    def test_header_detection_and_counts(self):
+        User.objects.create_user('M0000001', student_id='M0000001', first_name='Old', password='secret', has_changed_password=True)
+        User.objects.create_user('M0000002', student_id='M0000002', first_name='Old', password='secret')
+        lines = [
+            '姓名,學號\n',
+            '王小明,M0000001\n',
+            '李小華,M0000002\n',
+            '陳大文,M0000003\n',
+            ',M0000004\n',
+            'broken\n',
+        ]
+        result = import_roster(self.course, lines)
+        self.assertEqual((result.created, result.updated, result.skipped), (1, 2, 2))
+
+        kept = User.objects.get(username='M0000001')
+        self.assertEqual(kept.first_name, '王小明')
+        self.assertTrue(kept.check_password('secret'))
+        self.assertTrue(User.objects.get(username='M0000002').check_password('0002'))
+        created = User.objects.get(username='M0000003')
+        self.assertEqual((created.student_id, created.role), ('M0000003', 'student'))
+        self.assertTrue(created.check_password('0003'))
+        self.assertEqual(self.course.students.count(), 3)
+
+    def test_queries_scale_with_batches_not_rows(self):
+        lines = [f'S{i:06d},Student {i}\n' for i in range(1000)]
+        # A handful of statements per batch, never one per row. SQLite splits bulk inserts
+        # further, the wide roster rows (projects.roster) into ~50-row statements
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_roster(self.course, lines, batch_size=500)
+        self.assertLess(len(ctx.captured_queries), 70)
+        self.assertEqual(result.created, 1000)
+        self.assertEqual(self.course.students.count(), 1000)
+
+        # Re-importing is idempotent for enrollments
+        result = import_roster(self.course, lines[:10])
+        self.assertEqual((result.created, result.updated), (0, 10))
+        self.assertEqual(self.course.students.count(), 1000)
+
+    def test_rename_invalidates_groupmates(self):
+        students = make_students(4)
+        self.course.students.add(*students)
+        seed_groups(self.course, students)
+        DashboardStamp.objects.all().delete()
+        import_roster(self.course, ['S00000,Renamed\n'])
+        # The renamed student and both groupmates, not the student in the other group
+        self.assertEqual(
+            set(DashboardStamp.objects.values_list('user_id', flat=True)), {s.id for s in students[:3]}
+        )
+
+    def test_admin_upload(self):
+        admin_user = User.objects.create_superuser('admin', password='pw', role='professor', has_changed_password=True)
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile('roster.csv', '\ufeffstudent_id,name\nM1,甲\nM2,乙\n'.encode('utf-8'))
+        response = self.client.post(
+            reverse('admin:course-import-csv', args=[self.course.id]), {'csv_file': upload}, follow=True
+        )
+        self.assertContains(response, '2 created, 0 updated, 0 skipped')
+        self.assertEqual(self.course.students.count(), 2)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, STORAGES=PLAIN_STORAGES)
+class PasswordHashingTests(TestCase):
+    def test_parallel_hashes_match_inputs(self):
+        raw = [f'{i:04d}' for i in range(20)]
+        hashes = hash_passwords(raw, workers=2)
+        self.assertEqual(len(hashes), 20)
+        self.assertTrue(all(check_password(p, h) for p, h in zip(raw, hashes)))
+
+    def test_reset_password_action(self):
+        admin_user = User.objects.create_superuser('admin', password='pw', role='professor', has_changed_password=True)
+        students = [
+            User.objects.create_user(f'M00000{i}', student_id=f'M00000{i}', password='changed', has_changed_password=True)
+            for i in range(3)
+        ]
+        no_id = User.objects.create_user('guest', password='keep')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:projects_user_changelist'), {
+            'action': 'reset_password',
+            '_selected_action': [u.id for u in students] + [no_id.id],
+        })
+        for student in students:
+            student.refresh_from_db()
+            self.assertTrue(student.check_password(student.student_id[-4:]))
+            self.assertFalse(student.has_changed_password)
+        no_id.refresh_from_db()
+        self.assertTrue(no_id.check_password('keep'))
+
+
+class CachedAuthMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.student = User.objects.create_user('M1', student_id='M1', first_name='甲', password='pw', has_changed_password=True)
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        self.client.force_login(self.professor)
+        session = self.client.session
+        session['impersonate_user_id'] = self.student.id
+        session.save()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, len(ctx.captured_queries)
+
+    def test_impersonation_adds_no_queries_once_cached(self):
+        url = reverse('dashboard')
+        response, first = self.count_queries(url)
+        self.assertTrue(response.wsgi_request.is_impersonating)
+        self.assertEqual(response.wsgi_request.user, self.student)
+        self.assertEqual(response.wsgi_request.original_user, self.professor)
+        # Async views get the same user from request.auser()
+        self.assertEqual(async_to_sync(response.wsgi_request.auser)(), self.student)
+        cache.clear()  # rebuild the dashboard fragment so only the user lookups differ
+        response, second = self.count_queries(url)
+        self.assertEqual(response.wsgi_request.user, self.student)
+        # professor and impersonated student both come from the cache
+        self.assertEqual(first - second, 2)
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.get(reverse('dashboard'))
+        self.student.first_name = '乙'
+        self.student.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.wsgi_request.user.first_name, '乙')
+
+    def test_bulk_writes_invalidate_cache(self):
+        student = Client()
+        student.force_login(self.student)
+        student.get(reverse('dashboard'))
+        course = make_course()
+        with self.captureOnCommitCallbacks(execute=True):
+            import_roster(course, ['M1,丙\n'])
+        self.assertEqual(student.get(reverse('dashboard')).wsgi_request.user.first_name, '丙')
+
+        admin_user = User.objects.create_superuser('admin', password='pw', role='professor', has_changed_password=True)
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:projects_user_changelist'), {
+            'action': 'reset_password', '_selected_action': [self.student.id],
+        })
+        # The new password hash ends the old session at once, not after the cache TTL
+        response = student.get(reverse('dashboard'))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_asset_paths_skip_middlewares(self):
+        response, queries = self.count_queries('/media/submissions/report.pdf')
+        self.assertEqual(queries, 0)
+        self.assertFalse(hasattr(response.wsgi_request, 'is_impersonating'))
+
+
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course(semester='{{')
+        cls.students = make_students(6)
+        cls.course.students.add(*cls.students)
+        cls.groups = seed_groups(cls.course, cls.students)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dashboard_get_is_read_only(self):
+        # Leader of the second group has lost its own membership
+        Membership.objects.filter(group=self.groups[1], user=self.students[3]).delete()
+        self.client.force_login(self.students[0])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(response.context['course_list'][0]['has_group'], True)
+
+    def test_confirm_membership_swaps_card_and_counter(self):
+        membership = Membership.objects.get(group=self.groups[0], user=self.students[1])
+        self.client.force_login(self.students[1])
+        self.assertContains(self.client.get(reverse('dashboard')), '待確認邀請: 1')
+
+        url = reverse('confirm_membership', args=[membership.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, headers={'HX-Request': 'true'})
+        # After the UPDATE and its signal handlers, the card re-render needs one query
+        self.assertIn('"projects_membership"."group_id" IN', ctx.captured_queries[-1]['sql'])
+        membership.refresh_from_db()
+        self.assertTrue(membership.is_confirmed)
+        body = response.content.decode()
+        self.assertTrue(body.startswith(f'<div id="membership-{membership.id}"'))
+        self.assertIn('已確認加入', body)
+        self.assertIn('Student 2 (S00002)', body)
+        self.assertRegex(body, r'<span id="pending-invitations" hx-swap-oob="true"[^>]*>\s*待確認邀請: 0')
+        # Just the card and the counter, not the course list
+        self.assertNotIn('我的課程與時程', body)
+
+        # Confirming again changes no counter
+        response = self.client.post(url, headers={'HX-Request': 'true'})
+        self.assertNotIn('pending-invitations', response.content.decode())
+
+    def test_repair_data_command(self):
+        Membership.objects.filter(group=self.groups[1], user=self.students[3]).delete()
+        Membership.objects.filter(group=self.groups[0], user=self.students[0]).update(is_confirmed=False)
+        broken = make_course(name='PL ({{item.course.semester}})', semester='{{')
+
+        out = io.StringIO()
+        call_command('repair_data', '--dry-run', stdout=out)
+        self.assertIn('Would repair 1 missing leader memberships', out.getvalue())
+        self.assertFalse(Membership.objects.filter(group=self.groups[1], user=self.students[3]).exists())
+
+        out = io.StringIO()
+        call_command('repair_data', stdout=out)
+        self.assertIn('Repaired 1 missing leader memberships', out.getvalue())
+        broken.refresh_from_db()
+        self.assertEqual((broken.name, broken.semester), ('PL', '1'))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.semester, '1')
+        self.assertTrue(Membership.objects.get(group=self.groups[1], user=self.students[3]).is_confirmed)
+        self.assertTrue(Membership.objects.get(group=self.groups[0], user=self.students[0]).is_confirmed)
+
+    def test_repair_counts_only_inserted_memberships(self):
+        Membership.objects.filter(group=self.groups[1], user=self.students[3]).delete()
+        # The first membership appeared after the scan (another run, or the leader joined)
+        batch = [Membership(group=group, user=group.leader, is_confirmed=True) for group in self.groups[:2]]
+        self.assertEqual(repair_data._create_memberships(batch), 1)
+
+
+
+@override_settings(SERVER_MODE='asgi')
+class AsyncPageTests(TestCase):
+    """Under ASGI the page views are the async variants; they serve the same pages."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reload_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.reload_urls()
+
+    @staticmethod
+    def reload_urls():
+        importlib.reload(sys.modules[settings.ROOT_URLCONF])
+        clear_url_caches()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.students = make_students(6)
+        cls.course.students.add(*cls.students)
+        cls.groups = seed_groups(cls.course, cls.students)
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+
+    def test_routes_to_async_views(self):
+        for name, args in [('dashboard', []), ('confirm_membership', [1]), ('professor_dashboard', []),
+                           ('course_detail', [1])]:
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name, args=args)).func), name)
+
+    async def test_dashboard_and_confirmation(self):
+        membership = await Membership.objects.aget(group=self.groups[0], user=self.students[1])
+        await self.async_client.aforce_login(self.students[1])
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, '待確認邀請: 1')
+        etag = response['ETag']
+        response = await self.async_client.get(reverse('dashboard'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.post(
+            reverse('confirm_membership', args=[membership.id]), headers={'HX-Request': 'true'}
+        )
+        self.assertIn('Student 2 (S00002)', response.content.decode())
+        self.assertTrue((await Membership.objects.aget(pk=membership.pk)).is_confirmed)
+        response = await self.async_client.get(reverse('dashboard'), headers={'If-None-Match': etag})
+        self.assertContains(response, '待確認邀請: 0')
+
+    async def test_professor_pages(self):
+        await self.async_client.aforce_login(self.professor)
+        response = await self.async_client.get(reverse('professor_dashboard'))
+        self.assertContains(response, 'Programming Languages')
+        response = await self.async_client.get(reverse('course_detail', args=[self.course.id]))
+        self.assertContains(response, 'Group 2')
+        response = await self.async_client.get(
+            reverse('course_detail', args=[self.course.id]), headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('course_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.other_course = make_course(name='Compilers')
+        cls.students = make_students(9)
+        cls.course.students.add(*cls.students)
+        cls.other_course.students.add(cls.students[0])
+        cls.groups = seed_groups(cls.course, cls.students)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.students[1])
+        self.client.get(reverse('dashboard'))
+
+    def test_first_load_uses_fixed_queries(self):
+        cache.clear()
+        # session, dashboard version, memberships, group memberships (+ users), courses
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Student 0 (S00000)')
+
+    def test_repeat_load_skips_sql(self):
+        # Only the session and the dashboard version remain
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'), HTTP_HX_TARGET='dashboard-content')
+        self.assertContains(response, 'Group 1')
+
+    def assertInvalidated(self, expected_text):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertGreater(len(ctx.captured_queries), 2)
+        self.assertContains(response, expected_text)
+
+    def test_membership_change_invalidates(self):
+        membership = Membership.objects.get(user=self.students[2], group=self.groups[0])
+        membership.is_confirmed = True
+        membership.save()
+        self.assertInvalidated('Group 1')
+
+    def test_group_change_invalidates(self):
+        self.groups[0].name = 'Renamed'
+        self.groups[0].save()
+        self.assertInvalidated('Renamed')
+
+    def test_groupmate_rename_invalidates(self):
+        etag = self.client.get(reverse('dashboard'))['ETag']
+        groupmate = self.students[0]
+        groupmate.first_name = 'Renamed Leader'
+        groupmate.save()
+        response = self.client.get(reverse('dashboard'), headers={'If-None-Match': etag})
+        self.assertContains(response, 'Renamed Leader')
+        # A login changes nothing the cards show
+        etag = response['ETag']
+        self.students[2].save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(reverse('dashboard'), headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_course_change_invalidates(self):
+        self.course.name = 'Programming Languages II'
+        self.course.save()
+        self.assertInvalidated('Programming Languages II')
+
+    def test_enrollment_change_invalidates(self):
+        self.other_course.students.add(self.students[1])
+        self.assertInvalidated('Compilers')
+
+    def test_change_in_another_worker_invalidates(self):
+        # Another worker's cache still holds this render; only the database version moves
+        with mock.patch.object(cache, 'delete_many'), mock.patch.object(cache, 'delete'):
+            self.groups[0].name = 'Renamed elsewhere'
+            self.groups[0].save()
+        self.assertInvalidated('Renamed elsewhere')
+
+    def test_deleted_user_drops_stamp(self):
+        self.students[1].delete()
+        self.assertFalse(DashboardStamp.objects.filter(user_id=self.students[1].id).exists())
+
+    def test_unrelated_change_keeps_cache(self):
+        self.groups[2].name = 'Elsewhere'
+        self.groups[2].save()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('dashboard'))
+
+
+class CourseCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.students = make_students(9)
+
+    def assertCounters(self, students, groups, confirmed, submissions):
+        self.course.refresh_from_db()
+        self.assertEqual(
+            (self.course.student_count, self.course.group_count, self.course.confirmed_group_count, self.course.submission_count),
+            (students, groups, confirmed, submissions),
+        )
+
+    def test_signals_keep_counters_current(self):
+        self.course.students.add(*self.students)
+        self.assertCounters(9, 0, 0, 0)
+        self.students[8].enrolled_courses.remove(self.course)
+        self.assertCounters(8, 0, 0, 0)
+
+        group = Group.objects.create(course=self.course, name='G1', leader=self.students[0], project_name='P')
+        # A group without members is not confirmed
+        self.assertCounters(8, 1, 0, 0)
+        Membership.objects.create(group=group, user=self.students[0], is_confirmed=True)
+        self.assertCounters(8, 1, 1, 0)
+        pending = Membership.objects.create(group=group, user=self.students[1])
+        self.assertCounters(8, 1, 0, 0)
+        pending.is_confirmed = True
+        pending.save()
+        self.assertCounters(8, 1, 1, 0)
+
+        Submission.objects.create(group=group, type='proposal_draft', file='submissions/p.pdf')
+        self.assertCounters(8, 1, 1, 1)
+        self.students[7].delete()
+        self.assertCounters(7, 1, 1, 1)
+        group.delete()
+        self.assertCounters(7, 0, 0, 0)
+        self.course.students.clear()
+        self.assertCounters(0, 0, 0, 0)
+
+    def test_confirmation_touches_course_only_when_group_state_flips(self):
+        group = Group.objects.create(course=self.course, name='G1', leader=self.students[0], project_name='P')
+        first, second = (Membership.objects.create(group=group, user=student) for student in self.students[:2])
+
+        def course_writes(ctx):
+            return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "projects_course"')]
+
+        first.is_confirmed = True
+        with CaptureQueriesContext(connection) as ctx:
+            first.save(update_fields=['is_confirmed'])
+        self.assertEqual(course_writes(ctx), [])
+        second.is_confirmed = True
+        with CaptureQueriesContext(connection) as ctx:
+            second.save(update_fields=['is_confirmed'])
+        self.assertEqual(len(course_writes(ctx)), 1)
+        self.assertCounters(0, 1, 1, 0)
+
+    def test_rebuild_command(self):
+        self.course.students.add(*self.students)
+        seed_groups(self.course, self.students)  # bulk_create skips signals
+        Course.objects.update(student_count=0)
+        call_command('rebuild_course_counters', stdout=io.StringIO())
+        self.assertCounters(9, 3, 0, 0)
+
+    def test_professor_dashboard_is_one_query(self):
+        for i in range(30):
+            make_course(name=f'Course {i}')
+        self.client.force_login(self.professor)
+        self.client.get(reverse('professor_dashboard'))
+        # session, version stamp (projects.conditional) + courses
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('professor_dashboard'))
+        self.assertEqual(len(response.context['courses']), 31)
+
+
+class RosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.students = make_students(6)
+
+    def snapshot(self):
+        fields = [f.attname for f in CourseRosterRow._meta.concrete_fields if f.attname not in ('id', 'updated_at')]
+        return sorted(CourseRosterRow.objects.values_list(*fields))
+
+    def assertRosterCurrent(self):
+        """The incrementally maintained roster equals one rebuilt from scratch."""
+        maintained = self.snapshot()
+        CourseRosterRow.objects.all().delete()
+        sync_roster()
+        self.assertEqual(maintained, self.snapshot())
+
+    def row(self, student):
+        return CourseRosterRow.objects.get(course=self.course, student=student)
+
+    def test_signals_keep_roster_current(self):
+        leader, member, other = self.students[:3]
+        self.course.students.add(*self.students)
+        self.assertEqual(CourseRosterRow.objects.filter(course=self.course, is_enrolled=True).count(), 6)
+
+        group = Group.objects.create(course=self.course, name='G1', leader=leader, project_name='P')
+        Membership.objects.create(group=group, user=leader, is_confirmed=True)
+        pending = Membership.objects.create(group=group, user=member)
+        self.assertEqual((self.row(leader).group_name, self.row(leader).is_leader), ('G1', True))
+        self.assertEqual((self.row(member).is_leader, self.row(member).is_confirmed), (False, False))
+        pending.is_confirmed = True
+        pending.save()
+        self.assertTrue(self.row(member).is_confirmed)
+
+        group.name = 'Renamed'
+        group.save()
+        Submission.objects.create(group=group, type='proposal_draft', file='submissions/p.pdf')
+        Score.objects.create(group=group, team_base_score=Decimal('88'), individual_adjustments={member.student_id: 2})
+        Contribution.objects.create(group=group, student=member, description='parser', percentage=60)
+        self.assertEqual(
+            (self.row(leader).group_name, self.row(leader).submission_count, self.row(leader).team_base_score),
+            ('Renamed', 1, Decimal('88')),
+        )
+        self.assertEqual(self.row(member).contribution_description, 'parser')
+
+        member.first_name = 'New name'
+        member.save()
+        self.assertEqual(self.row(member).student_name, 'New name')
+        self.assertRosterCurrent()
+
+        # Dropping the course keeps the row while the student is still in a group
+        member.enrolled_courses.remove(self.course)
+        self.assertFalse(self.row(member).is_enrolled)
+        other.enrolled_courses.remove(self.course)
+        self.assertFalse(CourseRosterRow.objects.filter(student=other).exists())
+        pending.delete()
+        self.assertFalse(CourseRosterRow.objects.filter(student=member).exists())
+        group.delete()
+        self.assertIsNone(self.row(leader).group_id)
+        self.students[5].delete()
+        self.assertRosterCurrent()
+
+        self.course.delete()
+        self.assertFalse(CourseRosterRow.objects.exists())
+
+    def test_rebuild_command(self):
+        self.course.students.add(*self.students)
+        seed_groups(self.course, self.students)
+        CourseRosterRow.objects.all().delete()
+        call_command('rebuild_roster', stdout=io.StringIO())
+        self.assertEqual(CourseRosterRow.objects.filter(course=self.course, group__isnull=False).count(), 6)
+        self.assertRosterCurrent()
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.other_course = make_course(name='Compilers')
+        cls.students = make_students(6)
+        cls.course.students.add(*cls.students)
+        cls.other_course.students.add(cls.students[0])
+        cls.groups = seed_groups(cls.course, cls.students)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, etag, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+
+    def test_course_detail_not_modified_until_roster_changes(self):
+        self.client.force_login(self.professor)
+        url = reverse('course_detail', args=[self.course.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        # session and version stamp (the user is cached by now)
+        with self.assertNumQueries(2):
+            response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+        # The partial is a different representation
+        self.assertEqual(self.revalidate(url, etag, HTTP_HX_TARGET='course-detail-content').status_code, 200)
+
+        Score.objects.create(group=self.groups[0], team_base_score=Decimal('80'))
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_professor_dashboard_follows_counters(self):
+        self.client.force_login(self.professor)
+        url = reverse('professor_dashboard')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        Submission.objects.create(group=self.groups[1], type='proposal_draft', file='submissions/p.pdf')
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        self.other_course.delete()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_student_dashboard_uses_cached_render(self):
+        self.client.force_login(self.students[1])
+        url = reverse('dashboard')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        # session and dashboard version
+        with self.assertNumQueries(2):
+            response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 304)
+
+        Membership.objects.filter(group=self.groups[0], user=self.students[2]).get().delete()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        url = reverse('course_detail', args=[self.course.id])
+        self.client.force_login(self.professor)
+        etag = self.client.get(url)['ETag']
+        staff = User.objects.create_user('staff', password='pw', role='professor', has_changed_password=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_pending_messages_skip_conditional(self):
+        self.client.force_login(self.students[0])
+        url = reverse('dashboard')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        # Enrolled in two courses, so this flashes an error and redirects to the dashboard
+        self.client.get(reverse('create_group'))
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertContains(response, '請從特定課程中點擊')
+
+
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.students = make_students(3)
+        cls.group = seed_groups(cls.course, cls.students)[0]
+        cls.outsider = make_students(1, prefix='X')[0]
+
+    def setUp(self):
+        media, chunks = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(chunks.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media.name, CHUNKED_UPLOAD_ROOT=chunks.name, CHUNKED_UPLOAD_CHUNK_SIZE=4, SUBMISSION_MAX_SIZE=16
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.students[1])
+        self.payload = b'0123456789'
+
+    def start(self, **extra):
+        data = {'type': 'final_report', 'filename': 'report.zip', 'size': len(self.payload)}
+        data.update(extra)
+        return self.client.post(reverse('start_chunked_upload', args=[self.group.id]), data)
+
+    def put(self, state, offset, data, checksum=None):
+        headers = {'Upload-Offset': str(offset)}
+        if checksum:
+            headers['X-Chunk-Sha256'] = checksum
+        return self.client.put(state['chunk_url'], data, content_type='application/octet-stream', headers=headers)
+
+    def test_resumable_upload(self):
+        state = self.start().json()
+        self.assertEqual(state['offset'], 0)
+        self.assertEqual(self.put(state, 0, b'0123', hashlib.sha256(b'0123').hexdigest()).json()['offset'], 4)
+
+        # A corrupt chunk is rejected and rolled back
+        response = self.put(state, 4, b'4567', hashlib.sha256(b'oops').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 4)
+        # A chunk at the wrong offset tells the client where to resume
+        response = self.put(state, 8, b'89')
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4))
+
+        # Starting again (e.g. after a reload) resumes the same upload
+        resumed = self.start().json()
+        self.assertEqual((resumed['upload_id'], resumed['offset']), (state['upload_id'], 4))
+        self.put(resumed, 4, b'4567')
+        self.put(resumed, 8, b'89')
+
+        response = self.client.post(state['complete_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checksum'], hashlib.sha256(self.payload).hexdigest())
+        submission = Submission.objects.get(id=response.json()['submission_id'])
+        self.assertEqual((submission.group, submission.type), (self.group, 'final_report'))
+        with submission.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.payload)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_incomplete_or_mismatched_upload_is_refused(self):
+        state = self.start(checksum=hashlib.sha256(b'something else').hexdigest()).json()
+        self.put(state, 0, b'0123')
+        self.assertEqual(self.client.post(state['complete_url']).status_code, 400)
+        self.put(state, 4, b'4567')
+        self.put(state, 8, b'89')
+        response = self.client.post(state['complete_url'])
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'Checksum mismatch'))
+        self.assertFalse(Submission.objects.exists())
+
+    def test_oversized_upload_is_refused(self):
+        self.assertEqual(self.start(size=17).status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+        # The plain form for browsers without JavaScript has the same limit
+        response = self.client.post(reverse('upload_submission', args=[self.group.id]), {
+            'type': 'final_report', 'file': SimpleUploadedFile('report.zip', b'x' * 17),
+        })
+        self.assertFormError(response.context['form'], 'file', '檔案不可超過 0 MB。')
+        self.assertFalse(Submission.objects.exists())
+
+    def test_racing_completions_create_one_submission(self):
+        state = self.start().json()
+        for offset in (0, 4, 8):
+            self.put(state, offset, self.payload[offset:offset + 4])
+        # Both requests loaded the session before either finished; the part file is
+        # still there for the second, so only the row lock tells it the first won
+        first, second = UploadSession.objects.get(), UploadSession.objects.get()
+        with mock.patch('pathlib.Path.unlink'):
+            chunked_upload.assemble(first)
+            with self.assertRaises(chunked_upload.ChunkError) as raised:
+                chunked_upload.assemble(second)
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(self.client.post(state['complete_url']).status_code, 404)
+
+    def test_missing_part_file_is_404(self):
+        state = self.start().json()
+        self.put(state, 0, b'0123')
+        chunked_upload.part_path(UploadSession.objects.get()).unlink()
+        self.assertEqual(self.put(state, 4, b'4567').status_code, 404)
+        self.assertEqual(self.client.post(state['complete_url']).status_code, 404)
+
+    def test_only_members_and_owner_can_upload(self):
+        state = self.start().json()
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.start().status_code, 404)
+        self.assertEqual(self.put(state, 0, b'0123').status_code, 404)
+
+
+class SubmissionDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.students = make_students(4)
+        cls.group = seed_groups(cls.course, cls.students[:3])[0]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.submission = Submission(group=self.group, type='final_report')
+        self.submission.file.save('report.pdf', ContentFile(b'%PDF-0123456789'))
+        self.url = reverse('download_submission', args=[self.submission.id])
+
+    def test_permissions(self):
+        self.client.force_login(self.students[3])
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        for user in (self.students[1], self.professor):
+            self.client.force_login(user)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF-0123456789')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertTrue(self.client.get(self.url + '?download=1')['Content-Disposition'].startswith('attachment'))
+
+    def test_active_content_is_never_inline(self):
+        self.client.force_login(self.professor)
+        self.assertEqual(self.client.get(self.url)['Content-Security-Policy'], 'sandbox')
+        for name in ('page.html', 'image.svg'):
+            submission = Submission(group=self.group, type='proposal_draft', original_filename=name)
+            submission.file.save(name, ContentFile(b'<script>alert(1)</script>'))
+            response = self.client.get(reverse('download_submission', args=[submission.id]))
+            self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_missing_file_is_404(self):
+        self.client.force_login(self.professor)
+        self.submission.file.storage.delete(self.submission.file.name)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_range_and_conditional_requests(self):
+        self.client.force_login(self.professor)
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-8'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 5-8/15')
+        self.assertEqual(b''.join(response.streaming_content), b'0123')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=99-'}).status_code, 416)
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        # A stale If-Range validator means the client gets the whole (changed) file
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-1', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect', SENDFILE_URL_PREFIX='/protected-media/')
+    def test_offload_header(self):
+        self.client.force_login(self.professor)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.submission.file.name)
+        self.assertEqual(response.content, b'')
+
+
+class CourseSubmissionZipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.groups = seed_groups(cls.course, make_students(6))
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for group in self.groups:
+            for content in (b'draft v1', b'draft v2'):
+                sub = Submission(group=group, type='proposal_draft')
+                sub.file.save('proposal.pdf', ContentFile(content))
+        final = Submission(group=self.groups[0], type='final_report')
+        final.file.save('final.zip', ContentFile(b'x' * 200000))
+        self.client.force_login(self.professor)
+
+    def fetch(self, **params):
+        response = self.client.get(reverse('download_course_submissions', args=[self.course.id]), params)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_full_bundle(self):
+        archive = self.fetch()
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(archive.namelist()), 5)
+        final = [n for n in archive.namelist() if n.startswith(f'Group_1_{self.groups[0].id}/final_report/')]
+        self.assertEqual(archive.read(final[0]), b'x' * 200000)
+
+    def test_student_chosen_names_stay_inside_the_archive(self):
+        Group.objects.filter(pk=self.groups[0].pk).update(name='../../etc')
+        Group.objects.filter(pk=self.groups[1].pk).update(name='..')
+        Submission.objects.filter(group=self.groups[0]).update(original_filename='..\\..\\boot.ini')
+        names = self.fetch().namelist()
+        self.assertEqual(len(names), 5)
+        for name in names:
+            self.assertFalse(name.startswith('/') or '..' in name.split('/') or '\\' in name, name)
+        self.assertIn(f'group_{self.groups[1].id}/proposal_draft/v1_proposal.pdf', names)
+
+    def test_latest_of_one_type(self):
+        archive = self.fetch(type='proposal_draft', latest='1')
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertEqual({archive.read(n) for n in archive.namelist()}, {b'draft v2'})
+
+    def test_students_cannot_download(self):
+        self.client.force_login(self.groups[0].leader)
+        response = self.client.get(reverse('download_course_submissions', args=[self.course.id]))
+        self.assertEqual(response.status_code, 302)
+
+
+class DeduplicatedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.groups = seed_groups(cls.course, make_students(6))
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, group, content, name='proposal.pdf', type='proposal_draft'):
+        sub = Submission(group=group, type=type)
+        sub.file.save(name, ContentFile(content))
+        return sub
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload(self.groups[0], b'same bytes')
+        second = self.upload(self.groups[0], b'same bytes', name='renamed.pdf')
+        other = self.upload(self.groups[1], b'same bytes')
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+
+        self.assertEqual(first.file.name, f'submissions/{digest[:2]}/{digest}')
+        self.assertEqual({first.file.name, second.file.name, other.file.name}, {first.file.name})
+        self.assertEqual((first.filename, second.filename), ('proposal.pdf', 'renamed.pdf'))
+        blob = StoredBlob.objects.get(digest=digest)
+        self.assertEqual((blob.ref_count, blob.size), (3, 10))
+
+        # The bytes stay until the last submission referencing them is gone
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.delete()
+        self.assertTrue(other.file.storage.exists(other.file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(other.file.storage.exists(other.file.name))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_same_content_with_another_extension_shares_the_blob(self):
+        pdf = self.upload(self.groups[0], b'same bytes', name='report.pdf')
+        docx = self.upload(self.groups[1], b'same bytes', name='report.docx')
+        self.assertEqual(pdf.file.name, docx.file.name)
+        self.assertEqual((pdf.filename, docx.filename), ('report.pdf', 'report.docx'))
+        directory, blob = pdf.file.name.rsplit('/', 1)
+        self.assertEqual(pdf.file.storage.listdir(directory)[1], [blob])
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+        # The download still carries the student's name and its content type
+        self.client.force_login(User.objects.filter(membership__group=self.groups[0]).first())
+        response = self.client.get(reverse('download_submission', args=[pdf.id]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pdf.delete()
+            docx.delete()
+        self.assertFalse(pdf.file.storage.exists(pdf.file.name))
+
+    def test_replacing_the_file_moves_the_reference(self):
+        sub = self.upload(self.groups[0], b'old bytes')
+        old_name = sub.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            sub.file.save('fixed.pdf', ContentFile(b'new bytes'))
+        self.assertEqual(StoredBlob.objects.get().digest, hashlib.sha256(b'new bytes').hexdigest())
+        self.assertFalse(sub.file.storage.exists(old_name))
+        # Saving without touching the file keeps the count as it is
+        sub.save()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+    def test_blob_reused_before_commit_is_kept(self):
+        first = self.upload(self.groups[0], b'same bytes')
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        other = self.upload(self.groups[1], b'same bytes')
+        for callback in callbacks:
+            callback()
+        self.assertTrue(other.file.storage.exists(other.file.name))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+    def test_versions_per_group_and_type(self):
+        v1 = self.upload(self.groups[0], b'draft 1')
+        v2 = self.upload(self.groups[0], b'draft 2')
+        v3 = self.upload(self.groups[0], b'draft 2')
+        final = self.upload(self.groups[0], b'final', type='final_report')
+        elsewhere = self.upload(self.groups[1], b'draft 1')
+        self.assertEqual([v1.version, v2.version, v3.version, final.version, elsewhere.version], [1, 2, 3, 1, 1])
+        self.assertTrue(v2.is_new_content())
+        self.assertFalse(v3.is_new_content())
+        self.assertTrue(elsewhere.is_new_content())
+
+
+@override_settings(DIRECT_UPLOAD_BACKEND='projects.object_storage.LocalDirectUpload')
+class DirectUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.students = make_students(3)
+        cls.group = seed_groups(cls.course, cls.students)[0]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.students[0])
+
+    def presign(self, content=b'hello world'):
+        response = self.client.post(reverse('presign_submission_upload', args=[self.group.id]), {
+            'type': 'final_report', 'filename': 'final report.pdf', 'size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def upload(self, content=b'hello world'):
+        presigned = self.presign(content)
+        # The bucket does not rely on the session: an anonymous client can PUT with the signature
+        response = Client().put(presigned['upload_url'], content, content_type='application/pdf')
+        self.assertEqual(response.status_code, 200)
+        # Completing never reads the object back; the storage checked its digest on upload
+        with mock.patch.object(ContentAddressedStorage, 'open', side_effect=AssertionError("object body read")), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(presigned['complete_url'], {'ticket': presigned['ticket']})
+        self.assertEqual(response.status_code, 200)
+        return presigned, Submission.objects.get(id=response.json()['submission_id'])
+
+    def test_presigned_put_then_complete(self):
+        presigned, submission = self.upload()
+        self.assertEqual(presigned['headers'], {'Content-Type': 'application/pdf'})
+        self.assertEqual((submission.group, submission.filename, submission.version), (self.group, 'final report.pdf', 1))
+        self.assertEqual(submission.file.name, object_storage.read_ticket(presigned['ticket'])['key'])
+        with submission.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'hello world')
+        self.assertEqual(submission.sha256, hashlib.sha256(b'hello world').hexdigest())
+        self.assertEqual(StoredBlob.objects.get(digest=submission.sha256).ref_count, 1)
+
+    def test_identical_upload_shares_the_stored_object(self):
+        _, first = self.upload()
+        presigned, second = self.upload()
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(StoredBlob.objects.get(digest=first.sha256).ref_count, 2)
+        # The second copy is removed
+        self.assertFalse(first.file.storage.exists(object_storage.read_ticket(presigned['ticket'])['key']))
+
+    def test_ticket_is_single_use(self):
+        presigned, _ = self.upload()
+        response = self.client.post(presigned['complete_url'], {'ticket': presigned['ticket']})
+        self.assertIn(response.status_code, (400, 409))
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_rejects_missing_object_and_bad_signatures(self):
+        presigned = self.presign()
+        response = self.client.post(presigned['complete_url'], {'ticket': presigned['ticket']})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(presigned['complete_url'], {'ticket': presigned['ticket'] + 'x'})
+        self.assertEqual(response.status_code, 400)
+        tampered = presigned['upload_url'].replace('signature=', 'signature=x')
+        self.assertEqual(Client().put(tampered, b'hello world', content_type='application/pdf').status_code, 403)
+        self.assertEqual(Client().put(presigned['upload_url'], b'short', content_type='application/pdf').status_code, 400)
+        # Right size, wrong bytes: refused by the checksum and not stored
+        self.assertEqual(Client().put(presigned['upload_url'], b'hello there', content_type='application/pdf').status_code, 400)
+        self.assertEqual(self.client.post(presigned['complete_url'], {'ticket': presigned['ticket']}).status_code, 400)
+        response = Client().put(presigned['upload_url'], b'hello world', content_type='application/pdf', CONTENT_LENGTH='')
+        self.assertEqual(response.status_code, 411)
+        response = Client().put(presigned['upload_url'], b'hello world', content_type='application/pdf', CONTENT_LENGTH='11x')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_checksum_is_required(self):
+        response = self.client.post(reverse('presign_submission_upload', args=[self.group.id]), {
+            'type': 'final_report', 'filename': 'final report.pdf', 'size': 11,
+        })
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(DIRECT_UPLOAD_BACKEND='')
+    def test_disabled_by_default(self):
+        response = self.client.post(reverse('presign_submission_upload', args=[self.group.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BenchmarkBudgetTests(TestCase):
+    """The benchmark scenarios on a small seeded dataset must stay within the recorded query budgets."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('seed_benchmark_data', courses=2, students=80, groups=12, stdout=io.StringIO())
+
+    def test_seeded_data(self):
+        course = Course.objects.filter(name__startswith='Benchmark').order_by('id').first()
+        self.assertEqual((course.student_count, course.group_count, course.submission_count), (40, 6, 18))
+        self.assertEqual(Contribution.objects.filter(group__course=course).count(), 24)
+        self.assertEqual(StoredBlob.objects.get(digest=Submission.objects.first().sha256).ref_count, 9)
+
+    def test_views_within_query_budget(self):
+        results = run_benchmarks(iterations=2)
+        self.assertEqual(len(results), len(load_budgets()))
+        for result in results:
+            with self.subTest(result.name):
+                self.assertIsNotNone(result.budget)
+                self.assertFalse(result.over_budget, f"{result.name}: {result.queries} > {result.budget} queries")
+
+    def test_runs_leave_no_trace(self):
+        cache.set('kept', 1)
+        course = Course.objects.order_by('-student_count', 'id').first()
+        scenarios = [s for s in build_scenarios() if s.name in ('dashboard', 'import_csv')]
+        run_benchmarks(scenarios, iterations=1)
+        self.assertEqual(cache.get('kept'), 1)
+        # The import refreshed the counters and logins created sessions, all rolled back
+        self.assertEqual(Course.objects.get(id=course.id).updated_at, course.updated_at)
+        self.assertFalse(Session.objects.exists())
+
+
+@override_settings(
+    PROFILE_REQUESTS=True,
+    MIDDLEWARE=['projects.middleware.ProfilingMiddleware', *settings.MIDDLEWARE],
+)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.groups = seed_groups(cls.course, make_students(6))
+
+    def setUp(self):
+        view_metrics.reset()
+        self.client.force_login(self.professor)
+
+    def test_server_timing_and_metrics_page(self):
+        response = self.client.get(reverse('course_detail', args=[self.course.id]))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        stats = view_metrics.snapshot()['course_detail']
+        self.assertEqual(stats.requests, 1)
+        self.assertGreater(stats.total_queries, 0)
+        self.assertGreater(stats.template_time, 0)
+
+        response = self.client.get(reverse('profiling_metrics'))
+        self.assertContains(response, 'course_detail')
+        student = User.objects.filter(role='student').first()
+        self.client.force_login(student)
+        self.assertRedirects(self.client.get(reverse('profiling_metrics')), reverse('dashboard'))
+
+    def test_repeated_statements_are_reported(self):
+        profile = RequestProfile()
+        for group in self.groups:
+            profile.time_query(lambda *args: None, 'SELECT * FROM g WHERE id = %s', (group.id,), False, {})
+        profile.time_query(lambda *args: None, 'SELECT 1', (), False, {})
+        profile.finish()
+        view_metrics.record('grade_group', profile)
+        view_metrics.record('dashboard', RequestProfile())
+
+        slowest, offenders = report()
+        self.assertEqual({r['view'] for r in slowest}, {'grade_group', 'dashboard'})
+        self.assertEqual([(r['view'], r['worst_repeat']) for r in offenders], [('grade_group', 2)])
+        self.assertEqual(offenders[0]['max_queries'], 3)
+
+
+@override_settings(LIVE_COURSE_UPDATES=True)
+class CourseEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.groups = seed_groups(cls.course, make_students(6))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.professor)
+        self.async_client.force_login(self.professor)
+        for name, value in (('STREAM_DURATION', 0.2), ('POLL_INTERVAL', 0.05)):
+            patcher = mock.patch.object(live, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def stream(self, **headers):
+        # Served the way production serves it: through ASGI, consumed asynchronously
+        response = await self.async_client.get(reverse('course_events', args=[self.course.id]), headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    def test_changes_are_pushed_as_rerendered_rows(self):
+        group = self.groups[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            Membership.objects.filter(group=group, is_confirmed=False).first().save()
+            Score.objects.create(group=group, team_base_score=91)
+            Submission.objects.bulk_create([Submission(group=self.groups[0], type='final_report', file='x.pdf')])
+
+        body = async_to_sync(self.stream)(**{'Last-Event-ID': '0'})
+        # Two events for the same group, one row; bulk_create sends no signal
+        self.assertEqual(body.count('event: group-'), 1)
+        self.assertIn(f'id: 2\nevent: group-{group.id}\ndata: <tr id="group-row-{group.id}"', body)
+        self.assertIn('<span class="font-bold text-blue-600">91.00</span>', body)
+
+    def test_new_connection_starts_from_now(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Score.objects.create(group=self.groups[0], team_base_score=70)
+        self.assertEqual(async_to_sync(self.stream)(), 'retry: 5000\n\n')
+
+    def test_professors_only(self):
+        self.client.force_login(User.objects.filter(role='student').first())
+        self.assertEqual(self.client.get(reverse('course_events', args=[self.course.id])).status_code, 403)
+
+    def test_offered_only_when_enabled(self):
+        url = reverse('course_detail', args=[self.course.id])
+        self.assertContains(self.client.get(url), 'sse-connect=')
+        with self.settings(LIVE_COURSE_UPDATES=False):
+            self.assertNotContains(self.client.get(url), 'sse-connect=')
+            self.assertEqual(self.client.get(reverse('course_events', args=[self.course.id])).status_code, 204)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, STORAGES={**settings.STORAGES, **PLAIN_STORAGES})
+class PrepareStartupTests(TestCase):
+    def test_second_boot_skips_unchanged_work(self):
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root):
+            out = io.StringIO()
+            call_command('prepare_startup', stdout=out)
+            self.assertRegex(out.getvalue(), r'collectstatic\s+collected')
+            self.assertRegex(out.getvalue(), r'superuser\s+created')
+            self.assertTrue(User.objects.get(username='admin').is_superuser)
+
+            out = io.StringIO()
+            call_command('prepare_startup', stdout=out)
+            self.assertRegex(out.getvalue(), r'migrate\s+up to date, skipped')
+            self.assertRegex(out.getvalue(), r'collectstatic\s+unchanged, skipped')
+            self.assertRegex(out.getvalue(), r'superuser\s+exists')
+
+
+class GradingSheetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        cls.course = make_course()
+        cls.students = make_students(30)
+        cls.groups = seed_groups(cls.course, cls.students)
+        Score.objects.create(group=cls.groups[0], team_base_score=70, individual_adjustments={'OLD': 1.0})
+        Contribution.objects.bulk_create([
+            Contribution(group=g, student=s, description='work', percentage=Decimal('33.33'))
+            for g in cls.groups for s in g.members.all()
+        ])
+        Submission.objects.bulk_create([
+            Submission(group=g, type='proposal_draft', file=f'p{v}.pdf', version=v) for g in cls.groups for v in (1, 2)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.professor)
+        self.url = reverse('grading_sheet', args=[self.course.id])
+
+    def sheet_data(self, **changes):
+        """The POST the page submits: every field of every row, with `changes` applied."""
+        data = {}
+        for group in self.groups:
+            score = Score.objects.filter(group=group).first()
+            data[f'g{group.id}-team_base_score'] = score.team_base_score if score else 0
+            data[f'g{group.id}-professor_notes'] = score.professor_notes if score else ''
+            for member in group.members.all():
+                data[f'g{group.id}-adj_{member.id}'] = ''
+        data.update(changes)
+        return data
+
+    def test_sheet_loads_with_constant_queries(self):
+        # session, user, course, groups (+ score), memberships, contributions, latest submissions
+        with self.assertNumQueries(7):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['rows']), 10)
+        group, _ = response.context['rows'][0]
+        self.assertEqual([s.version for s in group.latest_submissions], [2])
+
+    def test_batch_save_in_one_transaction(self):
+        first, second = self.groups[0], self.groups[1]
+        member = second.members.order_by('id').first()
+        data = self.sheet_data(**{
+            f'g{first.id}-team_base_score': '85.50',
+            f'g{second.id}-team_base_score': '90',
+            f'g{second.id}-adj_{member.id}': '-2.5',
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, data, headers={'HX-Request': 'true'})
+        self.assertContains(response, '已儲存 2 組評分')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        # One bulk write each for new and changed scores and one roster refresh for both groups,
+        # which also moves the course pages' version stamp
+        self.assertEqual(len(writes), 3)
+        self.assertIn('projects_courserosterrow', writes[2])
+        self.assertEqual(CourseRosterRow.objects.get(student=member).team_base_score, Decimal('90'))
+
+        first_score, second_score = Score.objects.get(group=first), Score.objects.get(group=second)
+        self.assertEqual(first_score.team_base_score, Decimal('85.50'))
+        self.assertEqual(first_score.individual_adjustments, {'OLD': 1.0})
+        self.assertEqual(second_score.individual_adjustments, {member.student_id: -2.5})
+        self.assertEqual(Score.objects.count(), 2)
+
+    def test_invalid_batch_saves_nothing(self):
+        data = self.sheet_data(**{
+            f'g{self.groups[1].id}-team_base_score': '88',
+            f'g{self.groups[2].id}-team_base_score': 'abc',
+        })
+        response = self.client.post(self.url, data, headers={'HX-Request': 'true'})
+        self.assertContains(response, self.groups[2].name)
+        self.assertEqual(Score.objects.count(), 1)
+
+    def test_sheet_shows_final_grades(self):
+        response = self.client.get(self.url)
+        # A third of a three-person group is an equal share: the final grade is the team score
+        self.assertContains(response, '70.00')
+        finals = {m.student_id: m.final_grade for _, form in response.context['rows'] for m in form.members}
+        self.assertEqual({finals[s.student_id] for s in self.groups[0].members.all()}, {70.0})
+        self.assertIsNone(finals[self.groups[1].members.first().student_id])
+
+
+class GradeEngineTests(TestCase):
+    def grades(self, team, pct, groups, adjustment=None, **policy):
+        count = len(team)
+        return final_grades(
+            np.array(team, dtype=float), np.array(pct, dtype=float), np.array(groups),
+            np.array(adjustment or [0.0] * count), GradePolicy(**policy),
+        ).tolist()
+
+    def test_contribution_weighting_and_clamping(self):
+        nan = float('nan')
+        grades = self.grades(
+            [80, 80, 80, 90, nan], [75, 25, nan, 50, nan], [0, 0, 1, 1, 2], [0, 0, 0, 30, 0],
+            contribution_weight=1.0, max_contribution_factor=1.25,
+        )
+        # 75% of a pair is capped at 1.25x, 25% is half a share, no entry counts as an equal share
+        self.assertEqual(grades[:4], [100.0, 40.0, 80.0, 100.0])
+        self.assertTrue(np.isnan(grades[4]))
+
+    def test_curves(self):
+        team, pct, groups = [50, 70, float('nan')], [float('nan')] * 3, [0, 1, 2]
+        self.assertEqual(self.grades(team, pct, groups, curve='shift', target_mean=75)[:2], [65.0, 85.0])
+        self.assertEqual(self.grades(team, pct, groups, curve='shift', target_mean=40)[:2], [50.0, 70.0])
+        self.assertEqual(self.grades(team, pct, groups, curve='sqrt')[:2], [70.71, 83.67])
+        with self.assertRaises(ValueError):
+            GradePolicy(curve='bell')
+
+    @override_settings(GRADE_POLICY={'contribution_weight': 0.5})
+    def test_course_grades_from_database(self):
+        course = make_course()
+        students = make_students(2)
+        group = Group.objects.create(course=course, name='G', leader=students[0], project_name='P')
+        Membership.objects.bulk_create([Membership(group=group, user=s, is_confirmed=True) for s in students])
+        sync_roster([course.id])
+        Score.objects.create(group=group, team_base_score=Decimal('80'),
+                             individual_adjustments={students[1].student_id: 'not a number', students[0].student_id: 3})
+        Contribution.objects.create(group=group, student=students[0], description='', percentage=Decimal('60'))
+
+        with self.assertNumQueries(1):
+            grades = course_grades(course)
+        self.assertEqual(grades.by_student(), {students[0].student_id: 91.0, students[1].student_id: 80.0})
+        self.assertEqual([row.adjustment for row in grades], [3.0, 0.0])
+        self.assertEqual(len(course_grades(make_course(name='Empty'))), 0)
+
+    def test_group_grades_read_one_group(self):
+        course = make_course()
+        groups = seed_groups(course, make_students(6))
+        Score.objects.create(group=groups[0], team_base_score=Decimal('50'))
+        Score.objects.create(group=groups[1], team_base_score=Decimal('70'))
+        with self.assertNumQueries(1):
+            grades = group_grades(groups[1])
+        self.assertEqual([(row.group_id, row.final) for row in grades], [(groups[1].id, 70.0)] * 3)
+        # Shifting to the target mean needs the rest of the course
+        shifted = group_grades(groups[1], GradePolicy(curve='shift', target_mean=75))
+        self.assertEqual([row.final for row in shifted], [85.0] * 3)
+
+        orphan = Group.objects.create(course=None, name='Orphan', leader=groups[0].leader, project_name='P')
+        with self.assertNumQueries(0):
+            self.assertEqual(group_grades(orphan), [])
+
+    def test_grade_group_page_writes_nothing(self):
+        professor = User.objects.create_user('prof', password='pw', role='professor', has_changed_password=True)
+        group = seed_groups(make_course(), make_students(3))[0]
+        self.client.force_login(professor)
+        url = reverse('grade_group', args=[group.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['final_grades']), 3)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+        self.assertFalse(Score.objects.exists())
+
+        self.client.post(url, {'team_base_score': '88', 'professor_notes': ''})
+        self.assertEqual(Score.objects.get(group=group).team_base_score, Decimal('88'))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class MemberPickerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = make_course()
+        cls.students = make_students(30)
+        cls.course.students.add(*cls.students)
+        cls.leader, cls.other_leader = cls.students[0], cls.students[1]
+        cls.group = Group.objects.create(course=cls.course, name='Mine', leader=cls.leader, project_name='P')
+        other = Group.objects.create(course=cls.course, name='Theirs', leader=cls.other_leader, project_name='P')
+        Membership.objects.bulk_create([
+            Membership(group=cls.group, user=cls.leader, is_confirmed=True),
+            Membership(group=cls.group, user=cls.students[2]),
+            Membership(group=other, user=cls.other_leader, is_confirmed=True),
+            Membership(group=other, user=cls.students[3]),
+        ])
+        # In a group of another course only
+        elsewhere = make_course(name='Elsewhere')
+        elsewhere_group = Group.objects.create(course=elsewhere, name='X', leader=cls.students[4], project_name='P')
+        Membership.objects.create(group=elsewhere_group, user=cls.students[4], is_confirmed=True)
+        cls.outsider = make_students(1, prefix='T')[0]
+
+    def setUp(self):
+        self.client.force_login(self.leader)
+        self.url = reverse('search_members', args=[self.course.id])
+
+    def result_ids(self, response):
+        return [int(i) for i in re.findall(r'data-member-id="(\d+)"', response.content.decode())]
+
+    def test_eligibility_matches_group_form(self):
+        ids = set(eligible_students(self.course, self.leader).values_list('id', flat=True))
+        expected = {s.id for s in self.students[5:]} | {self.students[4].id}
+        self.assertEqual(ids, expected)
+        # Editing keeps the group's own members pickable
+        ids = set(eligible_students(self.course, self.leader, self.group).values_list('id', flat=True))
+        self.assertEqual(ids, expected | {self.students[2].id})
+
+    def test_search_by_prefix_in_one_query(self):
+        # session, user, course (enrollment checked in the lookup), then the search itself
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'q': 'S0001'})
+        self.assertEqual(self.result_ids(response), [s.id for s in self.students[10:20]])
+        response = self.client.get(self.url, {'q': 'student 2'})
+        self.assertEqual(self.result_ids(response), [s.id for s in self.students[20:30]])
+
+    def test_pages_with_keyset(self):
+        response = self.client.get(self.url)
+        first = self.result_ids(response)
+        self.assertEqual(len(first), 20)
+        after = re.search(r'after=([^&"]+)', response.content.decode()).group(1)
+        rest = self.result_ids(self.client.get(self.url, {'after': after}))
+        self.assertEqual(len(first) + len(rest), 26)
+        self.assertFalse(set(first) & set(rest))
+
+    def test_only_enrolled_students_and_group_leaders(self):
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.other_leader)
+        self.assertEqual(self.client.get(self.url, {'group_id': self.group.id}).status_code, 404)
+
+    def test_create_group_with_picked_members(self):
+        student = self.students[7]
+        self.client.force_login(student)
+        response = self.client.post(
+            f"{reverse('create_group')}?course_id={self.course.id}",
+            {'name': 'New', 'project_name': 'P', 'project_description': '',
+             'members': [self.students[8].id, self.students[3].id]},
+        )
+        # students[3] is already in another group of this course
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Group.objects.filter(name='New').exists())
+        self.client.post(
+            f"{reverse('create_group')}?course_id={self.course.id}",
+            {'name': 'New', 'project_name': 'P', 'project_description': '', 'members': [self.students[8].id]},
+        )
+        self.assertEqual(
+            set(Group.objects.get(name='New').members.values_list('id', flat=True)), {student.id, self.students[8].id}
+        )
+
+    def test_edit_form_renders_current_members_as_chips(self):
+        response = self.client.get(reverse('edit_group', args=[self.group.id]))
+        self.assertContains(response, f'name="members" value="{self.students[2].id}"')
+        self.assertContains(response, f'?group_id={self.group.id}')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, STORAGES=PLAIN_STORAGES)
+class AdminChangelistTests(TestCase):
+    changelists = ['user', 'group', 'submission', 'contribution', 'score']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root', 'root@example.com', 'pw', role='professor')
+
+    def add_rows(self, count, prefix):
+        students = make_students(count, prefix=prefix)
+        groups = seed_groups(make_course(name=prefix), students, group_size=1)
+        Submission.objects.bulk_create([Submission(group=g, type='proposal_draft', file=f'{g.id}.pdf') for g in groups])
+        Contribution.objects.bulk_create([
+            Contribution(group=g, student=s, description='', percentage=100) for g, s in zip(groups, students)
+        ])
+        Score.objects.bulk_create([Score(group=g, team_base_score=80) for g in groups])
+
+    def changelist_queries(self):
+        counts = {}
+        for name in self.changelists:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(f'admin:projects_{name}_changelist'))
+            self.assertEqual(response.status_code, 200)
+            counts[name] = len(ctx)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.admin)
+        self.add_rows(3, 'A')
+        self.changelist_queries()  # warm per-process caches (content types)
+        small = self.changelist_queries()
+        self.add_rows(30, 'B')
+        self.assertEqual(self.changelist_queries(), small)
+
+    def test_user_groups_column(self):
+        self.client.force_login(self.admin)
+        self.add_rows(2, 'A')
+        response = self.client.get(reverse('admin:projects_user_changelist'))
+        self.assertContains(response, '<td class="field-display_groups">Group 2</td>', html=True)
+
+    def test_unfiltered_big_table_uses_estimate(self):
+        self.client.force_login(self.admin)
+        self.add_rows(2, 'A')
+        with mock.patch('projects.paginators.estimated_count', return_value=123456):
+            response = self.client.get(reverse('admin:projects_submission_changelist'))
+            self.assertEqual(response.context['cl'].result_count, 123456)
+            # A filter needs the exact number
+            response = self.client.get(reverse('admin:projects_submission_changelist'), {'type__exact': 'proposal_draft'})
+            self.assertEqual(response.context['cl'].result_count, 2)
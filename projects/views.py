@@ -1,13 +1,43 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth.views import PasswordChangeView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.views.decorators.csrf import csrf_exempt
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.db.models import Count, Max, Prefetch, OuterRef, Subquery, aprefetch_related_objects, prefetch_related_objects
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from django.utils.text import get_valid_filename
+import asyncio
 import csv
-from .models import Group, Membership, User, Submission, Contribution, Score, Course
-from .forms import GroupForm, SubmissionForm, ScoreForm
+import hashlib
+import mimetypes
+import os
+from .models import Group, Membership, User, Submission, Contribution, Score, Course, UploadSession
+from .forms import (
+    GroupForm, SubmissionForm, ScoreForm, ChunkedUploadForm, DirectUploadForm, GradingRowForm, eligible_students,
+    member_label, search_students,
+)
+from . import chunked_upload
+from .downloads import iter_zip, serve_file
+from . import object_storage
+from .object_storage import LocalDirectUpload, get_direct_upload_backend
+from .storage import submission_storage
+from .caching import DASHBOARD_CACHE_TIMEOUT, adashboard_version, dashboard_cache_key, dashboard_version
+from .conditional import conditional_page
+from .htmx_utils import is_htmx, render_partial
+from . import live, profiling
+from .grade_engine import CourseGrades, group_grades, iter_course_grades
+from .grading import grading_sheet_groups, save_scores, sheet_grade_rows
+from .roster import course_roster, empty_groups, roster_groups
 
 class CustomPasswordChangeView(PasswordChangeView):
     success_url = reverse_lazy('dashboard') # Redirect to dashboard instead of password_change_done if we want a better UX
@@ -18,51 +48,110 @@ class CustomPasswordChangeView(PasswordChangeView):
         self.request.user.save()
         return response
 
+def is_professor(user):
+    return user.role == 'professor' or user.is_staff
+
+# The page views below come in pairs: a sync view for WSGI's threaded workers and an
+# async one (a-prefixed, async ORM) for ASGI, where a sync view would be queued on the
+# worker's single thread for sync code. core/urls.py routes by settings.SERVER_MODE.
+
+def request_dashboard_version(request):
+    """The user's dashboard version (projects.caching), read once per request."""
+    if not hasattr(request, '_dashboard_version'):
+        request._dashboard_version = dashboard_version(request.user.id)
+    return request._dashboard_version
+
+def dashboard_stamp(request):
+    # Signals bump the version whenever anything the dashboard shows changes
+    if is_professor(request.user):
+        return None
+    version = request_dashboard_version(request)
+    return version, version
+
+async def arequest_dashboard_version(request):
+    if not hasattr(request, '_dashboard_version'):
+        request._dashboard_version = await adashboard_version(request.user.id)
+    return request._dashboard_version
+
+async def adashboard_stamp(request):
+    if is_professor(request.user):
+        return None
+    version = await arequest_dashboard_version(request)
+    return version, version
+
+def _dashboard_response(request, content):
+    # Return partial if targeted, otherwise full page
+    if request.headers.get('HX-Target') == 'dashboard-content':
+        return HttpResponse(content)
+        
+    return render(request, 'projects/dashboard.html', {'dashboard_content': content})
+
 @login_required
+@conditional_page(dashboard_stamp)
 def dashboard(request):
     # Detect role and redirect if professor or staff
     if request.user.role == 'professor' or request.user.is_staff:
         return redirect('professor_dashboard')
         
-    # memberships for the user
-    memberships = Membership.objects.filter(user=request.user).select_related('group', 'group__course')
-    
-    # Courses the user is enrolled in
-    courses = Course.objects.filter(students=request.user).order_by('-year', '-semester')
-    
-    # identify courses where the user is already in a group
-    courses_with_groups = set()
-    for m in memberships:
-        if m.group.course:
-            courses_with_groups.add(m.group.course.id)
-            # Self-healing: ensure leader's own membership exists
-            if m.group.leader_id == request.user.id:
-                Membership.objects.get_or_create(user_id=request.user.id, group=m.group, defaults={'is_confirmed': True})
+    # Rendered partial is cached per user and version, so any worker's change retires it
+    cache_key = dashboard_cache_key(request.user.id, request_dashboard_version(request))
+    content = cache.get(cache_key)
+    if content is None:
+        content = render_to_string(
+            'projects/partials/dashboard_content.html', dashboard_context(request.user), request=request
+        )
+        cache.set(cache_key, content, DASHBOARD_CACHE_TIMEOUT)
+    return _dashboard_response(request, content)
+
+@login_required
+@conditional_page(adashboard_stamp)
+async def adashboard(request):
+    if request.user.role == 'professor' or request.user.is_staff:
+        return redirect('professor_dashboard')
+    cache_key = dashboard_cache_key(request.user.id, await arequest_dashboard_version(request))
+    content = await cache.aget(cache_key)
+    if content is None:
+        content = render_to_string(
+            'projects/partials/dashboard_content.html', await adashboard_context(request.user), request=request
+        )
+        await cache.aset(cache_key, content, DASHBOARD_CACHE_TIMEOUT)
+    return _dashboard_response(request, content)
+
+def _user_memberships(user):
+    # memberships for the user, with every group's member list prefetched
+    return Membership.objects.filter(user=user).select_related('group', 'group__course').prefetch_related(
+        Prefetch('group__membership_set', queryset=Membership.objects.select_related('user').order_by('id'))
+    )
+
+def _enrolled_courses(user):
+    return Course.objects.filter(students=user).order_by('-year', '-semester')
+
+def _dashboard_context(memberships, courses):
+    # identify courses where the user is already in a group.
+    # This GET is strictly read-only; data repairs run in `manage.py repair_data`.
+    courses_with_groups = {m.group.course_id for m in memberships if m.group.course_id}
     
-    # Pre-process courses: ensure no literal tags
-    course_list = []
-    for c in courses:
-        # DATA NORMALIZATION: If somehow semester contains literal tags, fix it
-        if '{{' in str(c.semester):
-            c.semester = '1'
-            c.save()
-            
-        course_list.append({
-            'course': c,
-            'has_group': c.id in courses_with_groups
-        })
+    course_list = [
+        {'course': c, 'has_group': c.id in courses_with_groups}
+        for c in courses
+    ]
     
-    context = {
+    return {
         'course_list': course_list,
         'memberships': memberships,
+        'pending_invitations': sum(not m.is_confirmed for m in memberships),
         'app_version': '3.2.0',
     }
-    
-    # Return partial if targeted, otherwise full page
-    if request.headers.get('HX-Target') == 'dashboard-content':
-        return render(request, 'projects/partials/dashboard_content.html', context)
-        
-    return render(request, 'projects/dashboard.html', context)
+
+def dashboard_context(user):
+    """Everything dashboard_content.html needs, loaded in three queries."""
+    return _dashboard_context(list(_user_memberships(user)), list(_enrolled_courses(user)))
+
+async def adashboard_context(user):
+    return _dashboard_context(
+        [m async for m in _user_memberships(user)], [c async for c in _enrolled_courses(user)]
+    )
+
 
 @login_required
 def create_group(request):
@@ -86,7 +175,7 @@ def create_group(request):
         return redirect('dashboard')
 
     if request.method == 'POST':
-        form = GroupForm(request.POST, user=request.user)
+        form = GroupForm(request.POST, user=request.user, course=course)
         if form.is_valid():
             from django.db import transaction
             with transaction.atomic():
@@ -105,12 +194,7 @@ def create_group(request):
                 
                 return redirect('dashboard')
     else:
-        form = GroupForm(user=request.user)
-        # Filter members to those in the same course
-        if course:
-            form.fields['members'].queryset = User.objects.filter(
-                role='student', enrolled_courses=course
-            ).exclude(id=request.user.id).exclude(joined_groups__course=course)
+        form = GroupForm(user=request.user, course=course)
             
     if request.headers.get('HX-Request') and not request.headers.get('HX-Boosted'):
         # If somehow a non-boosted HTMX request reaches here, still return full page or handle as needed
@@ -160,30 +244,90 @@ def edit_group(request, group_id):
                 return redirect('dashboard')
     else:
         # Pre-populate members
-        initial_members = group.members.exclude(id=group.leader.id)
+        initial_members = list(group.members.exclude(id=group.leader_id).values_list('id', flat=True))
         form = GroupForm(instance=group, user=request.user, course=course, initial={'members': initial_members})
         
     return render(request, 'projects/group_form.html', {'form': form, 'course': course, 'is_edit': True})
 
+MEMBER_SEARCH_PAGE_SIZE = 20
+
+@login_required
+def search_members(request, course_id):
+    """
+    Typeahead for GroupForm's member picker: eligible students of the course matching
+    `q` by student ID or name prefix, a page at a time (keyset on student ID, `after`).
+    """
+    course = get_object_or_404(Course, id=course_id, students=request.user)
+    group = None
+    if request.GET.get('group_id'):
+        # Editing: the group's own members stay eligible, and only its leader may look
+        group = get_object_or_404(Group, id=request.GET['group_id'], course=course, leader=request.user)
+    query = request.GET.get('q', '')
+    after = request.GET.get('after', '')
+    
+    students = search_students(eligible_students(course, request.user, group), query)
+    if after:
+        students = students.filter(student_id__gt=after)
+    # One extra row tells whether there is another page, without a COUNT
+    page = list(students.order_by('student_id').only('id', 'first_name', 'student_id')[:MEMBER_SEARCH_PAGE_SIZE + 1])
+    has_more = len(page) > MEMBER_SEARCH_PAGE_SIZE
+    page = page[:MEMBER_SEARCH_PAGE_SIZE]
+    
+    return render(request, 'projects/partials/member_search_results.html', {
+        'course': course,
+        'group': group,
+        'query': query,
+        'results': [(student, member_label(student)) for student in page],
+        'next_after': page[-1].student_id if has_more else None,
+        'is_next_page': bool(after),
+    })
+
+def _invitations(request):
+    # The user's other open invitations come with the membership, for the pending counter
+    pending = Membership.objects.filter(user=OuterRef('user'), is_confirmed=False).values('user')
+    return Membership.objects.select_related('group__course', 'group__leader').annotate(
+        pending_invitations=Subquery(pending.annotate(n=Count('pk')).values('n'))
+    ).filter(user=request.user)
+
+# Re-rendering the card's member list is the one extra query
+CARD_MEMBERS = Prefetch('group__membership_set', queryset=Membership.objects.select_related('user').order_by('id'))
+
+def _confirmed_card(request, membership, was_pending):
+    # Only the clicked card is swapped; the counter follows out of band.
+    oob = []
+    if was_pending:
+        oob.append(('projects/partials/pending_invitations.html',
+                    {'pending_invitations': (membership.pending_invitations or 1) - 1}))
+    return render_partial(request, 'projects/partials/membership_card.html', {'membership': membership}, oob=oob)
+
 @login_required
 def confirm_membership(request, membership_id):
-    membership = get_object_or_404(Membership, id=membership_id, user=request.user)
+    membership = get_object_or_404(_invitations(request), id=membership_id)
     if request.method == 'POST':
+        was_pending = not membership.is_confirmed
         membership.is_confirmed = True
-        membership.save()
+        membership.save(update_fields=['is_confirmed'])
         
-        if request.headers.get('HX-Request'):
-            # IMPORTANT: We MUST return the partial that matches the button's hx-target (#dashboard-content)
-            courses = Course.objects.filter(students=request.user).order_by('-year', '-semester')
-            memberships = Membership.objects.filter(user=request.user).select_related('group', 'group__course')
-            return render(request, 'projects/partials/dashboard_content.html', {
-                'courses': courses,
-                'memberships': memberships,
-            })
+        if is_htmx(request):
+            prefetch_related_objects([membership], CARD_MEMBERS)
+            return _confirmed_card(request, membership, was_pending)
             
         return redirect('dashboard')
     return render(request, 'projects/confirm_membership.html', {'membership': membership})
 
+@login_required
+async def aconfirm_membership(request, membership_id):
+    membership = await aget_object_or_404(_invitations(request), id=membership_id)
+    if request.method == 'POST':
+        was_pending = not membership.is_confirmed
+        membership.is_confirmed = True
+        await membership.asave(update_fields=['is_confirmed'])
+        if is_htmx(request):
+            await aprefetch_related_objects([membership], CARD_MEMBERS)
+            return _confirmed_card(request, membership, was_pending)
+        return redirect('dashboard')
+    return render(request, 'projects/confirm_membership.html', {'membership': membership})
+
 @login_required
 def upload_submission(request, group_id):
     group = get_object_or_404(Group, id=group_id, members=request.user)
@@ -194,16 +338,231 @@ def upload_submission(request, group_id):
             submission.group = group
             submission.save()
             messages.success(request, "檔案上傳成功！")
+            if not submission.is_new_content():
+                messages.info(request, "此檔案與上一版本內容相同。")
             return redirect('dashboard')
     else:
         form = SubmissionForm()
-    return render(request, 'projects/upload.html', {'form': form, 'group': group})
+    return render(request, 'projects/upload.html', {
+        'form': form,
+        'group': group,
+        'direct_upload': get_direct_upload_backend() is not None,
+    })
+
+def _upload_state(session):
+    return {
+        'upload_id': str(session.id),
+        'offset': session.offset,
+        'size': session.size,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        'chunk_url': reverse('chunked_upload', args=[session.id]),
+        'complete_url': reverse('complete_chunked_upload', args=[session.id]),
+    }
 
 @login_required
-def professor_dashboard(request):
+@require_POST
+def start_chunked_upload(request, group_id):
+    """Start (or resume) a chunked upload; the response says which offset to send next."""
+    group = get_object_or_404(Group, id=group_id, members=request.user)
+    form = ChunkedUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    session = chunked_upload.start_session(request.user, group, **form.cleaned_data)
+    return JsonResponse(_upload_state(session))
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def chunked_upload_view(request, upload_id):
+    session = get_object_or_404(UploadSession, id=upload_id, user=request.user)
+    if request.method == 'DELETE':
+        chunked_upload.discard(session)
+        return HttpResponse(status=204)
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return JsonResponse({'error': "Upload-Offset and Content-Length are required", 'offset': session.offset}, status=400)
+        try:
+            session.offset = chunked_upload.write_chunk(
+                session.id, request, offset, length, request.headers.get('X-Chunk-Sha256')
+            )
+        except chunked_upload.ChunkError as e:
+            return JsonResponse({'error': str(e), 'offset': e.offset}, status=e.status)
+    return JsonResponse(_upload_state(session))
+
+@login_required
+@require_POST
+def complete_chunked_upload(request, upload_id):
+    session = get_object_or_404(UploadSession.objects.select_related('group'), id=upload_id, user=request.user)
+    try:
+        submission, checksum = chunked_upload.assemble(session)
+    except chunked_upload.ChunkError as e:
+        return JsonResponse({'error': str(e), 'offset': e.offset}, status=e.status)
+    messages.success(request, "檔案上傳成功！")
+    if not submission.is_new_content():
+        messages.info(request, "此檔案與上一版本內容相同。")
+    return JsonResponse({'submission_id': submission.id, 'checksum': checksum, 'redirect': reverse('dashboard')})
+
+@login_required
+@require_POST
+def presign_submission_upload(request, group_id):
+    """Hand out a presigned PUT URL so the browser uploads straight to object storage."""
+    backend = get_direct_upload_backend()
+    if backend is None:
+        raise Http404
+    group = get_object_or_404(Group, id=group_id, members=request.user)
+    form = DirectUploadForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    checksum = data['checksum'].lower()
+    key = object_storage.new_object_key(data['filename'])
+    content_type = mimetypes.guess_type(data['filename'])[0] or 'application/octet-stream'
+    url, headers = backend.presign_put(key, content_type, data['size'], checksum)
+    return JsonResponse({
+        'upload_url': url,
+        'headers': headers,
+        'ticket': object_storage.sign_ticket(
+            request.user, group, data['type'], key, data['filename'], data['size'], checksum,
+        ),
+        'complete_url': reverse('complete_direct_upload'),
+    })
+
+@login_required
+@require_POST
+def complete_direct_upload(request):
+    """Completion callback: check the object landed in the bucket and record the Submission."""
+    backend = get_direct_upload_backend()
+    if backend is None:
+        raise Http404
+    try:
+        ticket = object_storage.read_ticket(request.POST.get('ticket', ''))
+    except signing.BadSignature:
+        return JsonResponse({'error': "Invalid or expired upload ticket"}, status=400)
+    if ticket['user'] != request.user.id:
+        raise Http404
+    group = get_object_or_404(Group, id=ticket['group'], members=request.user)
+    if not backend.object_matches(ticket['key'], ticket['size'], ticket['sha256']):
+        return JsonResponse({'error': "Uploaded object is missing or incomplete"}, status=400)
+    with transaction.atomic():
+        if not object_storage.claim_ticket(ticket):
+            return JsonResponse({'error': "This upload has already been completed"}, status=409)
+        submission = object_storage.adopt_object(group, ticket)
+    messages.success(request, "檔案上傳成功！")
+    if not submission.is_new_content():
+        messages.info(request, "此檔案與上一版本內容相同。")
+    return JsonResponse({'submission_id': submission.id, 'checksum': submission.sha256, 'redirect': reverse('dashboard')})
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def local_bucket_put(request):
+    """Development stand-in for an S3 presigned PUT (see object_storage.LocalDirectUpload)."""
+    try:
+        key, size, sha256 = LocalDirectUpload.verify(request.GET.get('signature', ''))
+    except signing.BadSignature:
+        return HttpResponse(status=403)
+    if not request.META.get('CONTENT_LENGTH'):
+        return HttpResponse(status=411)
+    try:
+        length = int(request.META['CONTENT_LENGTH'])
+    except ValueError:
+        return HttpResponse(status=400)
+    if length != size:
+        return HttpResponse(status=400)
+    storage = submission_storage()
+    path = storage.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest = hashlib.sha256()
+    with open(path + '.part', 'wb') as fh:
+        for block in iter(lambda: request.read(64 * 1024), b''):
+            digest.update(block)
+            fh.write(block)
+    if digest.hexdigest() != sha256:
+        # Like S3's BadDigest: nothing is stored
+        os.unlink(path + '.part')
+        return HttpResponse(status=400)
+    os.replace(path + '.part', path)
+    return HttpResponse(status=200)
+
+@login_required
+def download_submission(request, submission_id):
+    """Permission-checked download/preview of a submission file (Range and conditional GET aware)."""
+    submission = get_object_or_404(Submission.objects.select_related('group'), id=submission_id)
+    is_professor = request.user.role == 'professor' or request.user.is_staff
+    if not is_professor and not Membership.objects.filter(group=submission.group, user=request.user).exists():
+        raise Http404
+    filename = submission.filename
+    try:
+        path = submission.file.path
+    except NotImplementedError:
+        # Remote storage: let it hand out its own (signed) URL
+        return redirect(submission.file.url)
+    return serve_file(
+        request, path, filename,
+        as_attachment=bool(request.GET.get('download')),
+        offload_path=submission.file.name,
+    )
+
+@login_required
+def download_course_submissions(request, course_id):
+    """Stream every submission of a course as one ZIP, optionally one type and/or latest only."""
     if request.user.role != 'professor' and not request.user.is_staff:
         return redirect('dashboard')
-    courses = Course.objects.all().order_by('-year', '-semester')
+    course = get_object_or_404(Course, id=course_id)
+    submissions = Submission.objects.filter(group__course=course).select_related('group')
+    
+    sub_type = request.GET.get('type')
+    if sub_type in dict(Submission.TYPE_CHOICES):
+        submissions = submissions.filter(type=sub_type)
+    if request.GET.get('latest'):
+        submissions = submissions.latest_versions()
+    submissions = submissions.order_by('group__name', 'group_id', 'type', 'id')
+    
+    response = StreamingHttpResponse(
+        iter_zip(_submission_zip_entries(submissions)), content_type='application/zip'
+    )
+    filename = f"{course.name}_{sub_type or 'all'}{'_latest' if request.GET.get('latest') else ''}.zip"
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+def _zip_name_part(value, fallback):
+    """One path component from student-entered text: no separators, no '..', never empty."""
+    try:
+        return get_valid_filename(os.path.basename(value.replace('\\', '/')))
+    except SuspiciousFileOperation:
+        return fallback
+
+def _submission_zip_entries(submissions):
+    used = set()
+    for sub in submissions.iterator(chunk_size=500):
+        uploaded = timezone.localtime(sub.uploaded_at)
+        # Group names and file names are chosen by students; the group id keeps folders distinct
+        folder = f"{_zip_name_part(sub.group.name, 'group')}_{sub.group_id}/{sub.type}"
+        filename = _zip_name_part(sub.filename, 'file')
+        name = f"{folder}/v{sub.version}_{filename}"
+        if name in used:
+            name = f"{folder}/{sub.id}_{filename}"
+        used.add(name)
+        yield name, uploaded, lambda f=sub.file: f.open('rb')
+
+# Counter refreshes bump updated_at as well; the count notices deleted courses
+COURSES_STAMP = {'last': Max('updated_at'), 'n': Count('id')}
+
+def _professor_dashboard_stamp(stamp):
+    return f"{stamp['n']}:{stamp['last']}", stamp['last']
+
+def professor_dashboard_stamp(request):
+    if not is_professor(request.user):
+        return None
+    return _professor_dashboard_stamp(Course.objects.aggregate(**COURSES_STAMP))
+
+async def aprofessor_dashboard_stamp(request):
+    if not is_professor(request.user):
+        return None
+    return _professor_dashboard_stamp(await Course.objects.aaggregate(**COURSES_STAMP))
+
+def _professor_dashboard_response(request, courses):
     context = {'courses': courses}
     
     if request.headers.get('HX-Target') == 'professor-dashboard-content':
@@ -212,20 +571,66 @@ def professor_dashboard(request):
     return render(request, 'projects/professor_dashboard.html', context)
 
 @login_required
+@conditional_page(professor_dashboard_stamp)
+def professor_dashboard(request):
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return redirect('dashboard')
+    return _professor_dashboard_response(request, Course.objects.all().order_by('-year', '-semester'))
+
+@login_required
+@conditional_page(aprofessor_dashboard_stamp)
+async def aprofessor_dashboard(request):
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return redirect('dashboard')
+    return _professor_dashboard_response(request, [c async for c in Course.objects.all().order_by('-year', '-semester')])
+
+def _course_stamp(course_id):
+    # Roster refreshes stamp their rows rather than the Course row; take the newest of both
+    return Course.objects.filter(id=course_id).annotate(
+        roster_changed=Max('roster_rows__updated_at'),
+    ).values_list('updated_at', 'roster_changed')
+
+def _newest(stamp):
+    if stamp is None:
+        return None
+    updated_at = max(filter(None, stamp))
+    return updated_at, updated_at
+
+def course_stamp(request, course_id):
+    if not is_professor(request.user):
+        return None
+    return _newest(_course_stamp(course_id).first())
+
+async def acourse_stamp(request, course_id):
+    if not is_professor(request.user):
+        return None
+    return _newest(await _course_stamp(course_id).afirst())
+
+@login_required
+@conditional_page(course_stamp)
 def course_detail(request, course_id):
     if request.user.role != 'professor' and not request.user.is_staff:
         return redirect('dashboard')
     course = get_object_or_404(Course, id=course_id)
-    groups = Group.objects.filter(course=course)
-    
-    # Students who are not in any group in this course
-    assigned_student_ids = Membership.objects.filter(group__course=course).values_list('user_id', flat=True)
-    unassigned_students = course.students.exclude(id__in=assigned_student_ids)
-    
+    # Groups and unassigned students both come from one scan of the roster read model
+    return _course_detail_response(request, course, list(course_roster(course)), list(empty_groups(course)))
+
+@login_required
+@conditional_page(acourse_stamp)
+async def acourse_detail(request, course_id):
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return redirect('dashboard')
+    course = await aget_object_or_404(Course, id=course_id)
+    return _course_detail_response(
+        request, course, [row async for row in course_roster(course)], [g async for g in empty_groups(course)],
+    )
+
+def _course_detail_response(request, course, rows, empty):
     context = {
         'course': course,
-        'groups': groups,
-        'unassigned_students': unassigned_students,
+        'groups': roster_groups(rows, empty),
+        'unassigned_students': [row for row in rows if row.group_id is None and row.is_enrolled],
+        'live_updates': settings.LIVE_COURSE_UPDATES,
     }
     
     if request.headers.get('HX-Target') == 'course-detail-content':
@@ -233,12 +638,57 @@ def course_detail(request, course_id):
         
     return render(request, 'projects/course_detail.html', context)
 
+@login_required
+async def course_events(request, course_id):
+    """Server-Sent Events stream of re-rendered group rows for the live course_detail table."""
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return HttpResponseForbidden()
+    if not settings.LIVE_COURSE_UPDATES:
+        # 204 tells EventSource to stop reconnecting (e.g. a page rendered before a switch to WSGI)
+        return HttpResponse(status=204)
+    course = await aget_object_or_404(Course, id=course_id)
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        # New connection: the page was just rendered, so only later changes matter
+        last_seq = await live.acurrent_sequence(course.id)
+    response = StreamingHttpResponse(_course_event_stream(request, course, last_seq), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def _course_event_stream(request, course, last_seq):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + live.STREAM_DURATION
+    quiet_since = loop.time()
+    # Reconnect delay for EventSource once the stream ends or drops
+    yield 'retry: 5000\n\n'
+    while loop.time() < deadline:
+        last_seq, events = await live.aevents_since(course.id, last_seq)
+        group_ids = {event['group_id'] for event in events}
+        if group_ids:
+            # One render per changed group, however many events it had
+            rows = [row async for row in course_roster(course).filter(group_id__in=group_ids)]
+            # A group whose last member left still needs its row redrawn
+            empty = [g async for g in empty_groups(course, group_ids)]
+            for group in roster_groups(rows, empty):
+                html = render_to_string('projects/partials/course_group_row.html', {'group': group}, request=request)
+                yield live.format_event(f'group-{group.id}', html, id=last_seq)
+            quiet_since = loop.time()
+        elif loop.time() - quiet_since >= live.HEARTBEAT_INTERVAL:
+            # Comment line: keeps proxies from closing an idle connection
+            yield ': keep-alive\n\n'
+            quiet_since = loop.time()
+        await asyncio.sleep(live.POLL_INTERVAL)
+
 @login_required
 def grade_group(request, group_id):
     if request.user.role != 'professor' and not request.user.is_staff:
         return redirect('dashboard')
     group = get_object_or_404(Group, id=group_id)
-    score, created = Score.objects.get_or_create(group=group)
+    # Ungraded groups get their Score when the form is saved, not on every visit
+    score = Score.objects.filter(group=group).first() or Score(group=group)
     
     if request.method == 'POST':
         form = ScoreForm(request.POST, instance=score)
@@ -251,14 +701,51 @@ def grade_group(request, group_id):
     
     submissions = Submission.objects.filter(group=group).order_by('-uploaded_at')
     contributions = Contribution.objects.filter(group=group)
+    final_grades = group_grades(group)
     
     return render(request, 'projects/grading.html', {
         'group': group,
         'form': form,
         'submissions': submissions,
-        'contributions': contributions
+        'contributions': contributions,
+        'final_grades': final_grades,
     })
 
+@login_required
+def grading_sheet(request, course_id):
+    """Grade a whole course on one page; HTMX posts edits in debounced batches."""
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return redirect('dashboard')
+    course = get_object_or_404(Course, id=course_id)
+    groups = list(grading_sheet_groups(course))
+    data = request.POST if request.method == 'POST' else None
+    rows = [
+        (group, GradingRowForm(
+            data, prefix=f'g{group.id}', instance=getattr(group, 'score', None) or Score(group=group),
+            members=[m.user for m in group.membership_set.all()],
+        ))
+        for group in groups
+    ]
+    
+    if request.method == 'POST':
+        forms = [form for _, form in rows]
+        if all(form.is_valid() for form in forms):
+            saved = save_scores(course, [form.save(commit=False) for form in forms if form.has_changed()])
+            if is_htmx(request):
+                return render(request, 'projects/partials/grading_status.html', {'saved': saved})
+            messages.success(request, f"已儲存 {saved} 組評分。")
+            return redirect('grading_sheet', course_id=course.id)
+        if is_htmx(request):
+            errors = [(group, form.errors) for group, form in rows if form.errors]
+            return render(request, 'projects/partials/grading_status.html', {'errors': errors})
+    
+    # Final grades as currently saved, shown next to each member
+    finals = CourseGrades(sheet_grade_rows(groups)).by_student()
+    for group in groups:
+        for membership in group.membership_set.all():
+            membership.user.final_grade = finals.get(membership.user.student_id)
+    return render(request, 'projects/grading_sheet.html', {'course': course, 'rows': rows})
+
 @login_required
 def export_grades_csv(request):
     if request.user.role != 'professor' and not request.user.is_staff:
@@ -269,37 +756,48 @@ def export_grades_csv(request):
     
     filename = f"grades_{course.name}.csv" if course else "all_grades.csv"
     
-    response = HttpResponse(content_type='text/csv')
+    # Stream rows as they are read so memory stays flat for very large exports.
+    response = StreamingHttpResponse(_iter_grade_rows(course), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+class _Echo:
+    """Pseudo-buffer for csv.writer: writerow() returns the line instead of storing it."""
+    def write(self, value):
+        return value
+
+def _iter_grade_rows(course, chunk_size=2000):
+    writer = csv.writer(_Echo())
     # Fix for Chinese characters in Excel
-    response.write('\ufeff'.encode('utf8'))
-    writer = csv.writer(response)
-    writer.writerow(['學號', '姓名', '組別', '計畫名稱', '小組分數', '貢獻度(%)', '貢獻度描述'])
-    
-    memberships = Membership.objects.select_related('user', 'group', 'group__course', 'group__score').all()
-    if course:
-        memberships = memberships.filter(group__course=course)
+    yield '\ufeff'
+    yield writer.writerow(['學號', '姓名', '組別', '計畫名稱', '小組分數', '貢獻度(%)', '貢獻度描述', '個人加減分', '最終成績'])
     
-    for m in memberships:
-        score_obj = getattr(m.group, 'score', None)
-        team_score = score_obj.team_base_score if score_obj else "未評分"
-        
-        # Get contribution for this specific student in this group
-        contrib = Contribution.objects.filter(group=m.group, student=m.user).first()
-        pct = f"{contrib.percentage}%" if contrib else "未填寫"
-        desc = contrib.description if contrib else ""
-        
-        writer.writerow([
-            m.user.student_id,
-            m.user.first_name,
-            m.group.name,
-            m.group.project_name,
-            team_score,
-            pct,
-            desc
-        ])
-    
-    return response
+    # One query for every row; final grades are computed a course at a time
+    for grades in iter_course_grades(course, chunk_size=chunk_size):
+        for row in grades:
+            yield writer.writerow([
+                row.student_id,
+                row.name,
+                row.group_name,
+                row.project_name,
+                row.team_score if row.team_score is not None else "未評分",
+                f"{row.contribution:.2f}%" if row.contribution is not None else "未填寫",
+                row.contribution_description,
+                f"{row.adjustment:.2f}" if row.adjustment else "",
+                f"{row.final:.2f}" if row.graded else "未評分",
+            ])
+
+@login_required
+def profiling_metrics(request):
+    if request.user.role != 'professor' and not request.user.is_staff:
+        return redirect('dashboard')
+    slowest, offenders = profiling.report()
+    return render(request, 'projects/metrics.html', {
+        'enabled': settings.PROFILE_REQUESTS,
+        'window_minutes': profiling.view_metrics.window // 60,
+        'slowest': slowest,
+        'offenders': offenders,
+    })
 
 @login_required
 def impersonate_user(request, user_id):
@@ -1,25 +1,28 @@
 #!/bin/bash
+set -e
 
-# Apply migrations
-python manage.py migrate
+STARTUP_BEGAN=$(date +%s.%N)
+export STARTUP_BEGAN
 
-# Collect static files
-python manage.py collectstatic --noinput
+# Migrations, static files and the admin account, in one Django process; migrate and
+# collectstatic are skipped when nothing changed since the last boot
+python manage.py prepare_startup
 
-# Create superuser if it doesn't exist (Only if not in production or for first setup)
-python manage.py shell << END
-from django.contrib.auth import get_user_model
-User = get_user_model()
-if not User.objects.filter(username='admin').exists():
-    User.objects.create_superuser('admin', 'admin@example.com', 'admin123', role='professor', student_id='PROF01', has_changed_password=True)
-END
-
-# Start server (Development or Gunicorn)
-# Use Railway's $PORT or default to 8000
+# Start server (Development or Gunicorn); Railway's $PORT, or 8000
 APP_PORT=${PORT:-8000}
 
+# SERVER_MODE=asgi runs on uvicorn workers with the async page views (see
+# core/urls.py), so a slow database round-trip no longer blocks a whole worker;
+# the live course board's event stream needs it too. The default stays on WSGI.
+# Workers, threads and preloading come from gunicorn.conf.py.
 if [ "$DEBUG" = "False" ]; then
-    gunicorn core.wsgi --bind 0.0.0.0:$APP_PORT
+    if [ "$SERVER_MODE" = "asgi" ]; then
+        exec gunicorn core.asgi:application --config gunicorn.conf.py --worker-class uvicorn_worker.UvicornWorker
+    else
+        exec gunicorn core.wsgi --config gunicorn.conf.py
+    fi
+elif [ "$SERVER_MODE" = "asgi" ]; then
+    exec uvicorn core.asgi:application --reload --host 0.0.0.0 --port $APP_PORT
 else
-    python manage.py runserver 0.0.0.0:$APP_PORT
+    exec python manage.py runserver 0.0.0.0:$APP_PORT
 fi